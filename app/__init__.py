@@ -1,7 +1,20 @@
 from flask import Flask
+
 from config import Config
 
-app = Flask(__name__)
-app.config.from_object(Config)
 
-from app import views
\ No newline at end of file
+def create_app(config=Config) -> Flask:
+    """Фабрика приложения. Модули с моделями и тяжёлыми зависимостями
+    подключаются здесь, а не при `import app`, поэтому воркеры
+    gunicorn и `flask` CLI стартуют быстро."""
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    from app import metrics
+    from app.commands import commands
+    from app.views import main
+
+    metrics.init_app(app)
+    app.register_blueprint(main)
+    app.register_blueprint(commands)
+    return app
@@ -0,0 +1,226 @@
+import datetime
+import hashlib
+import json
+import re
+
+from pymongo import ASCENDING, GEOSPHERE, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+
+# Здания из выгрузки OSM (GeoJSON после ogr2ogr, как в ноутбуке) лежат в
+# коллекции buildings: контур (geometry), центроид (centroid) и нужные
+# теги. Оба поля под индексом 2dsphere, поэтому карта получает только
+# здания в видимой области.
+
+BUILDINGS_COLLECTION = 'buildings'
+CHANGES_COLLECTION = 'buildings_changes'
+BATCH_SIZE = 1000
+MAX_FEATURES = 5000
+# До этого зума отдаём только центроиды, до FULL_ZOOM — упрощённые
+# контуры, дальше — контуры как есть
+POLYGON_ZOOM = 14
+FULL_ZOOM = 17
+
+TAGS = ['osm_id', 'osm_way_id', 'name', 'building', 'building:levels',
+        'addr:street', 'addr:housenumber', 'start_date']
+
+_OTHER_TAGS = re.compile(r'"((?:[^"\\]|\\.)*)"=>"((?:[^"\\]|\\.)*)"')
+
+
+def parse_other_tags(other_tags: str) -> dict:
+    """'"building"=>"yes","building:levels"=>"5"' -> dict."""
+    if not other_tags:
+        return {}
+    return {key.replace('\\"', '"'): value.replace('\\"', '"')
+            for key, value in _OTHER_TAGS.findall(other_tags)}
+
+
+def iter_features(path: str, chunk_size: int = 1 << 20):
+    """Потоково читать features из GeoJSON: файл не грузится в память
+    целиком, объекты по одному разбираются из массива "features"."""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as file:
+        buffer = ''
+        start = None
+        while start is None:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            buffer += chunk
+            match = re.search(r'"features"\s*:\s*\[', buffer)
+            if match:
+                start = match.end()
+        buffer = buffer[start:]
+        eof = False
+        while True:
+            position = 0
+            while True:
+                while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                    position += 1
+                if position < len(buffer) and buffer[position] == ']':
+                    return
+                try:
+                    feature, position = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                yield feature
+            if eof:
+                if buffer[position:].strip():
+                    raise ValueError(f'{path}: broken GeoJSON')
+                return
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+
+
+def create_buildings_indexes(collection):
+    collection.create_indexes([IndexModel([('geometry', GEOSPHERE)]),
+                               IndexModel([('centroid', GEOSPHERE)]),
+                               IndexModel([('key', ASCENDING)], unique=True),
+                               IndexModel([('OBJECTID', ASCENDING)])])
+
+
+def building_key(osm_id, osm_way_id, centroid) -> str:
+    """Ключ здания: id отношения или линии OSM, а без них — WKT центроида
+    (shapely-точка) с полной точностью. Общий для buildings и app/osm.py."""
+    if osm_id:
+        return 'r' + str(osm_id)
+    if osm_way_id:
+        return 'w' + str(osm_way_id)
+    return 'c' + centroid.wkt
+
+
+def building_doc(feature: dict):
+    from shapely.geometry import mapping, shape
+
+    properties = dict(feature.get('properties') or {})
+    properties.update(parse_other_tags(properties.pop('other_tags', None)))
+    if not properties.get('building') or not feature.get('geometry'):
+        return None
+    polygon = shape(feature['geometry'])
+    if polygon.is_empty or not polygon.is_valid:
+        return None
+    doc = {tag: properties[tag] for tag in TAGS if properties.get(tag)}
+    doc['key'] = building_key(doc.get('osm_id'), doc.get('osm_way_id'),
+                              polygon.centroid)
+    doc['geometry'] = feature['geometry']
+    doc['centroid'] = mapping(polygon.centroid)
+    doc['bbox'] = list(polygon.bounds)
+    doc['hash'] = hashlib.sha1(json.dumps(
+        doc, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return doc
+
+
+def load_buildings(db, path: str) -> dict:
+    """Загрузить здания из GeoJSON в коллекцию buildings. Перезаписываются
+    только изменившиеся здания, а их границы пишутся в buildings_changes,
+    чтобы пересобрать только затронутые тайлы."""
+    collection = db.get_collection(BUILDINGS_COLLECTION)
+    create_buildings_indexes(collection)
+    existing = {doc['key']: doc for doc in collection.find(
+        {}, {'key': 1, 'hash': 1, 'bbox': 1, '_id': 0})}
+    features = iter_features(path)
+
+    seen = set()
+    changes = []
+    counts = {'total': 0, 'changed': 0, 'removed': 0}
+    batch = []
+    for feature in features:
+        doc = building_doc(feature)
+        if doc is None or doc['key'] in seen:
+            continue
+        seen.add(doc['key'])
+        counts['total'] += 1
+        old = existing.get(doc['key'])
+        if old is not None and old.get('hash') == doc['hash']:
+            continue
+        changes.append(doc['bbox'])
+        if old is not None:
+            changes.append(old['bbox'])
+        batch.append(UpdateOne({'key': doc['key']}, _update(doc), upsert=True))
+        if len(batch) == BATCH_SIZE:
+            counts['changed'] += _write(collection, batch)
+            batch = []
+    if batch:
+        counts['changed'] += _write(collection, batch)
+
+    removed = [key for key in existing if key not in seen]
+    for i in range(0, len(removed), BATCH_SIZE):
+        keys = removed[i:i+BATCH_SIZE]
+        changes += [existing[key]['bbox'] for key in keys]
+        counts['removed'] += collection.delete_many(
+            {'key': {'$in': keys}}).deleted_count
+
+    if changes:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        db.get_collection(CHANGES_COLLECTION).insert_many(
+            [{'bbox': bbox, 'at': now} for bbox in changes])
+    return counts
+
+
+def _update(doc: dict) -> dict:
+    """Обновляем только поля OSM: OBJECTID, year, area и floors пишет
+    сопоставление с ФИАС (linkage), и перезагрузка их не стирает.
+    Теги, которые пропали из выгрузки, удаляем."""
+    update = {'$set': doc}
+    removed = {tag: '' for tag in TAGS if tag not in doc}
+    if removed:
+        update['$unset'] = removed
+    return update
+
+
+def _write(collection, batch: list) -> int:
+    try:
+        result = collection.bulk_write(batch, ordered=False)
+        return result.upserted_count + result.modified_count
+    except BulkWriteError as error:
+        # Контуры, которые 2dsphere не принял (самопересечения), пропускаем
+        return error.details['nUpserted'] + error.details['nModified']
+
+
+def parse_bbox(bbox: str) -> list:
+    """'minLon,minLat,maxLon,maxLat' -> список float или ValueError."""
+    values = [float(value) for value in bbox.split(',')]
+    if len(values) != 4 or values[0] >= values[2] or values[1] >= values[3]:
+        raise ValueError('bbox must be minLon,minLat,maxLon,maxLat')
+    return values
+
+
+def _bbox_polygon(bbox: list) -> dict:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return {'type': 'Polygon', 'coordinates': [[
+        [min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat],
+        [min_lon, max_lat], [min_lon, min_lat]]]}
+
+
+def _tolerance(zoom: int) -> float:
+    # Примерно один пиксель тайла 256x256 в градусах на этом зуме
+    return 360 / (256 * 2 ** zoom)
+
+
+def buildings_in_bbox(db, bbox: list, zoom: int) -> dict:
+    from shapely.geometry import mapping, shape
+
+    collection = db.get_collection(BUILDINGS_COLLECTION)
+    area = {'$geometry': _bbox_polygon(bbox)}
+    projection = {tag: 1 for tag in TAGS}
+    projection['_id'] = 0
+    if zoom < POLYGON_ZOOM:
+        query = {'centroid': {'$geoWithin': area}}
+        projection['centroid'] = 1
+    else:
+        query = {'geometry': {'$geoIntersects': area}}
+        projection['geometry'] = 1
+
+    features = []
+    for doc in collection.find(query, projection).limit(MAX_FEATURES):
+        if zoom < POLYGON_ZOOM:
+            geometry = doc.pop('centroid')
+        elif zoom < FULL_ZOOM:
+            geometry = mapping(shape(doc.pop('geometry')).simplify(
+                _tolerance(zoom), preserve_topology=True))
+        else:
+            geometry = doc.pop('geometry')
+        features.append({'type': 'Feature', 'geometry': geometry,
+                         'properties': doc})
+    return {'type': 'FeatureCollection', 'features': features,
+            'truncated': len(features) == MAX_FEATURES}
@@ -0,0 +1,201 @@
+import functools
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from app.mongodb_connection import BoD_db
+from config import Config
+
+# Кэш ответов моделей. Данные ФИАС меняются только при импорте, поэтому
+# горячие страницы можно отдавать без обращения к БД.
+#
+# Сброс явный: invalidate() увеличивает номер поколения в BoD.cache_state.
+# Номер поколения входит в ключ, а каждый процесс перечитывает его не чаще
+# раза в CACHE_GENERATION_CHECK секунд — так импорт из отдельного процесса
+# (flask build-views и т.п.) сбрасывает кэш и у всех воркеров.
+
+_MISSING = object()
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """Кэш в Redis. Кэш необязателен: если Redis недоступен, get
+    отвечает промахом, set ничего не делает, и данные берутся из Mongo."""
+
+    def __init__(self, url: str, ttl: int, prefix: str = 'bod:'):
+        import redis
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+
+    def get(self, key):
+        try:
+            raw = self._redis.get(self.prefix + key)
+        except self._errors as error:
+            logger.warning('redis cache get failed: %s', error)
+            return _MISSING
+        if raw is None:
+            return _MISSING
+        return pickle.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self._redis.set(self.prefix + key, pickle.dumps(value), ex=self.ttl)
+        except self._errors as error:
+            logger.warning('redis cache set failed: %s', error)
+
+    def clear(self):
+        # Ключи старого поколения истекут сами по TTL
+        pass
+
+    def __len__(self):
+        try:
+            return self._redis.dbsize()
+        except self._errors:
+            return 0
+
+
+class NullCache:
+
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class CacheStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def hit(self, name: str):
+        with self._lock:
+            self.hits[name] = self.hits.get(name, 0) + 1
+
+    def miss(self, name: str):
+        with self._lock:
+            self.misses[name] = self.misses.get(name, 0) + 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {name: {'hits': self.hits.get(name, 0),
+                           'misses': self.misses.get(name, 0)}
+                    for name in sorted(set(self.hits) | set(self.misses))}
+
+
+stats = CacheStats()
+_backend = None
+_generation = None
+_generation_checked = 0.0
+_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                if Config.CACHE_BACKEND == 'redis':
+                    _backend = RedisCache(Config.CACHE_REDIS_URL,
+                                          Config.CACHE_TTL)
+                elif Config.CACHE_BACKEND == 'memory':
+                    _backend = LRUCache(Config.CACHE_MAXSIZE,
+                                        Config.CACHE_TTL)
+                else:
+                    _backend = NullCache()
+    return _backend
+
+
+def _state():
+    return BoD_db().cache_state
+
+
+def generation() -> int:
+    global _generation, _generation_checked
+    now = time.monotonic()
+    if _generation is None or now - _generation_checked > Config.CACHE_GENERATION_CHECK:
+        doc = _state().find_one({'_id': 'generation'})
+        current = doc['value'] if doc else 0
+        if _generation is not None and current != _generation:
+            get_backend().clear()
+        _generation = current
+        _generation_checked = now
+    return _generation
+
+
+def invalidate():
+    """Сбросить кэш во всех процессах (вызывать после импорта данных)."""
+    global _generation
+    _state().update_one({'_id': 'generation'}, {'$inc': {'value': 1}},
+                        upsert=True)
+    get_backend().clear()
+    _generation = None
+
+
+def cached(name: str):
+    """Read-through кэш для функции модели. Аргументы входят в ключ через
+    repr, поэтому должны быть простыми (строки, числа, списки строк).
+    Возвращаемые значения общие для всех вызовов — не изменяйте их."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            if isinstance(backend, NullCache):
+                return func(*args, **kwargs)
+            key = f'{generation()}:{name}:{args!r}:{sorted(kwargs.items())!r}'
+            value = backend.get(key)
+            if value is not _MISSING:
+                stats.hit(name)
+                return value
+            stats.miss(name)
+            value = func(*args, **kwargs)
+            backend.set(key, value)
+            return value
+        return wrapper
+    return decorator
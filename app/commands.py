@@ -0,0 +1,210 @@
+import csv
+
+import click
+from flask import Blueprint
+
+from app import cache
+from app.buildings import load_buildings
+from app.geocoder import Geocoder
+from app.indexes import check_query_plans, create_indexes
+from app.linkage import load_and_link, mingkh_records, write_reports
+from app.materialize import descendants, rebuild_views, refresh_views
+from app.mongodb_connection import BoD_db
+from app.osm import export_buildings
+from app.pagination import clear_counts
+from app.search import rebuild_search, refresh_search
+from app.stats import rebuild_stats
+from app.tiles import build_tiles
+
+# Команды регистрируются прямо в `flask ...` (без своей группы). Модули с
+# тяжёлыми зависимостями (lxml, requests, bs4) импортируются внутри
+# команд, чтобы не замедлять запуск веб-воркеров.
+commands = Blueprint('commands', __name__, cli_group=None)
+
+
+@commands.cli.command('build-search')
+def build_search():
+    """Пересобрать коллекцию search (поиск по улицам и домам)."""
+    count = rebuild_search(BoD_db())
+    clear_counts()
+    cache.invalidate()
+    click.echo(f'search: {count} documents')
+
+
+@commands.cli.command('db-indexes')
+@click.option('--check', is_flag=True,
+              help='Только проверить планы запросов, индексы не создавать.')
+def db_indexes(check):
+    """Создать индексы BoD и проверить, что ни один запрос моделей
+    не делает COLLSCAN."""
+    db = BoD_db()
+    if not check:
+        created = create_indexes(db)
+        click.echo(f'indexes: {", ".join(created) or "nothing new"}')
+    failures = check_query_plans(db)
+    for collection, filter, stages in failures:
+        click.echo(f'COLLSCAN: {collection} {filter} {stages}', err=True)
+    if failures:
+        raise SystemExit(1)
+    click.echo('query plans: ok')
+
+
+@commands.cli.command('build-views')
+@click.option('--full', is_flag=True, help='Пересобрать всё с нуля.')
+def build_views(full):
+    """Собрать house_view / addrobj_view (по умолчанию — только изменённое)."""
+    db = BoD_db()
+    if full:
+        counts = rebuild_views(db)
+    else:
+        counts = refresh_views(db)
+    rebuild_stats(db)
+    cache.invalidate()
+    for name, count in counts.items():
+        click.echo(f'{name}: {count} documents')
+
+
+@commands.cli.command('build-stats')
+def build_stats():
+    """Пересобрать house_stats и сводку для /api/stats (это делают и
+    команды импорта, вручную — если данные меняли мимо них)."""
+    db = BoD_db()
+    result = rebuild_stats(db)
+    clear_counts()
+    cache.invalidate()
+    click.echo(f'stats: {result["houses"]} houses')
+
+
+@commands.cli.command('cache-clear')
+def cache_clear():
+    """Сбросить кэш моделей во всех процессах (после импорта данных)."""
+    cache.invalidate()
+    click.echo('cache: invalidated')
+
+
+@commands.cli.command('load-buildings')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def load_buildings_command(path):
+    """Загрузить здания из GeoJSON выгрузки OSM в коллекцию buildings."""
+    db = BoD_db()
+    counts = load_buildings(db, path)
+    rebuild_stats(db)
+    cache.invalidate()
+    click.echo('buildings: {total} total, {changed} changed, '
+               '{removed} removed'.format(**counts))
+
+
+@commands.cli.command('export-buildings')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('target', type=click.Path(dir_okay=False))
+def export_buildings_command(source, target):
+    """Переложить GeoJSON зданий OSM в Parquet/Feather (по расширению
+    TARGET) с центроидами и площадями."""
+    click.echo(f'buildings: {export_buildings(source, target)}')
+
+
+@commands.cli.command('build-tiles')
+@click.option('--full', is_flag=True, help='Пересобрать все тайлы.')
+def build_tiles_command(full):
+    """Собрать векторные тайлы зданий в MBTiles (по умолчанию — только
+    тайлы под изменёнными зданиями)."""
+    count = build_tiles(BoD_db(), full=full)
+    click.echo(f'tiles: {count} built')
+
+
+@commands.cli.command('import-fias')
+@click.argument('path', type=click.Path(exists=True, file_okay=False))
+@click.option('--workers', type=int, default=None,
+              help='Число процессов (по умолчанию — по числу ядер).')
+def import_fias_command(path, workers):
+    """Полный импорт выгрузки ГАР ФИАС (каталог с AS_*.XML) для Димитровграда,
+    затем индексы, *_view, search и сброс кэша."""
+    from app.fias_import import import_fias
+
+    db = BoD_db()
+    counts = import_fias(path, workers=workers)
+    for name, count in counts.items():
+        click.echo(f'{name}: {count} documents')
+    create_indexes(db)
+    rebuild_views(db)
+    rebuild_search(db)
+    rebuild_stats(db)
+    clear_counts()
+    cache.invalidate()
+    click.echo('indexes, views, search, stats: rebuilt')
+
+
+@commands.cli.command('apply-fias-delta')
+@click.argument('path', type=click.Path(exists=True, file_okay=False))
+@click.option('--workers', type=int, default=None,
+              help='Число процессов (по умолчанию — по числу ядер).')
+def apply_fias_delta_command(path, workers):
+    """Применить дельту ГАР ФИАС (каталог с AS_*.XML) и обновить только
+    затронутые *_view и search. Повторный запуск той же версии ничего
+    не делает."""
+    from app.fias_import import apply_delta
+
+    db = BoD_db()
+    result = apply_delta(path, workers=workers)
+    if not result['applied']:
+        click.echo(f'delta {result["version"]}: already applied')
+        return
+    for name, count in result['counts'].items():
+        click.echo(f'{name}: {count} objects')
+    objectids = result['objectids']
+    refresh_views(db, objectids)
+    refresh_search(db, sorted(descendants(db, set(objectids))))
+    rebuild_stats(db)
+    clear_counts()
+    cache.invalidate()
+    click.echo(f'delta {result["version"]}: {len(objectids)} objects affected')
+
+
+@commands.cli.command('link-buildings')
+@click.option('--mingkh-pages', type=int, default=11,
+              help='Сколько страниц списка домов dom.mingkh.ru обойти.')
+@click.option('--report-prefix', default='',
+              help='Префикс пути для CSV с несопоставленными записями.')
+def link_buildings_command(mingkh_pages, report_prefix):
+    """Сопоставить дома ФИАС, dom.mingkh.ru и здания OSM и записать год,
+    площадь и этажность в house_facts (и в связанные здания buildings)."""
+    from app.scraper import Scraper, crawl_mingkh
+
+    scraper = Scraper('scraper_cache')
+    mingkh = mingkh_records(crawl_mingkh(scraper, pages=mingkh_pages))
+    db = BoD_db()
+    result = load_and_link(db, mingkh)
+    rebuild_stats(db)
+    cache.invalidate()
+    for source in ['mingkh', 'osm']:
+        report = result[source]
+        click.echo(f'{source}: {len(report["matched"])} matched, '
+                   f'{len(report["unmatched_left"])} unmatched, '
+                   f'{len(report["ambiguous"])} ambiguous')
+    for path in write_reports(result, report_prefix):
+        click.echo(f'report: {path}')
+
+
+@commands.cli.command('geocode')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.argument('target', type=click.Path(dir_okay=False))
+@click.option('--column', default='address', help='Колонка с адресом.')
+@click.option('--delimiter', default=';')
+def geocode_command(source, target, column, delimiter):
+    """Геокодировать адреса из CSV локально (без dadata) и записать CSV
+    с value, house_fias_id, fias_objectid, geo_lat, geo_lon, qc."""
+    geocoder = Geocoder.from_db(BoD_db())
+    fields = ['value', 'house_fias_id', 'fias_objectid', 'geo_lat',
+              'geo_lon', 'qc']
+    with open(source, 'r', encoding='utf-8', newline='') as file:
+        rows = list(csv.DictReader(file, delimiter=delimiter))
+    results = geocoder.geocode_many([row[column] for row in rows])
+    with open(target, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.DictWriter(file, list(rows[0]) + fields if rows else fields,
+                                delimiter=delimiter, extrasaction='ignore')
+        writer.writeheader()
+        for row, result in zip(rows, results):
+            writer.writerow(dict(row, **{field: result.get(field)
+                                         for field in fields}))
+    found = sum(1 for result in results if result['qc'] < 3)
+    click.echo(f'geocoded: {found} of {len(results)}')
@@ -0,0 +1,39 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import metrics
+from config import Config
+
+# Пул потоков для независимых запросов к Mongo внутри одного запроса
+# страницы (pymongo синхронный, но отпускает GIL на сети). Как и
+# MongoClient, пул один на процесс и пересоздаётся после fork.
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(Config.LOOKUP_THREADS,
+                                               thread_name_prefix='lookup')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def parallel(*calls) -> list:
+    """Выполнить функции без аргументов параллельно и вернуть их
+    результаты по порядку. Первая выполняется в текущем потоке; команды
+    Mongo из остальных засчитываются в трассу текущего запроса. При
+    LOOKUP_THREADS = 0 всё выполняется последовательно."""
+    if Config.LOOKUP_THREADS <= 0 or len(calls) < 2:
+        return [call() for call in calls]
+    trace = metrics.current()
+    futures = [get_executor().submit(metrics.run_with_trace, trace, call)
+               for call in calls[1:]]
+    first = calls[0]()
+    return [first] + [future.result() for future in futures]
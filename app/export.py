@@ -0,0 +1,213 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+
+from app.buildings import BUILDINGS_COLLECTION
+
+# Выгрузка коллекций целиком (CSV, GeoJSON, Parquet). Документы идут из
+# курсора пачками по BATCH_SIZE и сразу превращаются в куски ответа,
+# поэтому память не растёт с размером коллекции.
+
+BATCH_SIZE = 5000
+# Размер куска, который отдаётся клиенту (и gzip'у) за раз
+CHUNK_SIZE = 1 << 16
+FORMATS = {'csv': 'text/csv',
+           'geojson': 'application/geo+json',
+           'parquet': 'application/vnd.apache.parquet'}
+# Для домов геометрию берём из связанного здания OSM (см. app/linkage.py)
+LINKED_GEOMETRY = ['houses', 'house_view']
+
+
+def _value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def _batches(cursor):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _columns(collection, filter: dict) -> list:
+    """Все поля выборки — отдельным проходом на сервере: у документов
+    house_view разный набор PARAM_N_*, и первая пачка видит не все.
+    Порядок — по позиции поля в документе."""
+    rows = collection.aggregate([
+        {'$match': filter},
+        {'$project': {'_id': 0, 'keys': {'$map': {
+            'input': {'$objectToArray': '$$ROOT'}, 'as': 'field',
+            'in': '$$field.k'}}}},
+        {'$unwind': {'path': '$keys', 'includeArrayIndex': 'position'}},
+        {'$group': {'_id': '$keys', 'position': {'$min': '$position'}}},
+        {'$sort': {'position': 1, '_id': 1}},
+    ], allowDiskUse=True)
+    return [row['_id'] for row in rows if row['_id'] != '_id']
+
+
+def _with_geometry(db, name: str, batch: list) -> list:
+    if name == BUILDINGS_COLLECTION:
+        return [(doc.pop('geometry', None), doc) for doc in batch]
+    if name not in LINKED_GEOMETRY:
+        return [(None, doc) for doc in batch]
+    ids = [doc['OBJECTID'] for doc in batch if doc.get('OBJECTID')]
+    points = {building['OBJECTID']: building['centroid'] for building in
+              db.get_collection(BUILDINGS_COLLECTION).find(
+                  {'OBJECTID': {'$in': ids}},
+                  {'OBJECTID': 1, 'centroid': 1, '_id': 0})}
+    return [(points.get(doc.get('OBJECTID')), doc) for doc in batch]
+
+
+def _csv(batches, columns: list):
+    buffer = io.StringIO()
+    writer = None
+    for batch in batches:
+        if writer is None:
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        writer.writerows([[_value(doc.get(column)) for column in columns]
+                          for doc in batch])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _geojson(db, name: str, batches):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = '\n'
+    for batch in batches:
+        features = []
+        for geometry, doc in _with_geometry(db, name, batch):
+            doc.pop('_id', None)
+            features.append(json.dumps(
+                {'type': 'Feature', 'geometry': geometry,
+                 'properties': {key: _value(value)
+                                for key, value in doc.items()}},
+                ensure_ascii=False))
+        yield separator + ',\n'.join(features)
+        separator = ',\n'
+    yield '\n]}\n'
+
+
+class _Sink:
+    """Файл для ParquetWriter, который ничего не хранит: записанное
+    забирается генератором после каждой пачки."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet(batches, columns: list):
+    import pyarrow
+    import pyarrow.parquet
+
+    def open_writer(columns):
+        # Документы в Mongo разнородные, поэтому все колонки строковые
+        schema = pyarrow.schema([(column, pyarrow.string())
+                                 for column in columns])
+        return pyarrow.parquet.ParquetWriter(sink, schema,
+                                             compression='zstd')
+
+    sink = _Sink()
+    writer = None
+    try:
+        for batch in batches:
+            if writer is None:
+                writer = open_writer(columns)
+            writer.write_table(pyarrow.table(
+                {column: [None if doc.get(column) is None
+                          else str(_value(doc[column])) for doc in batch]
+                 for column in columns}, schema=writer.schema))
+            yield sink.drain()
+        if writer is None:
+            # Пустая выборка — всё равно корректный (пустой) файл
+            writer = open_writer(columns)
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+
+def _chunked(parts):
+    """Склеить мелкие куски в блоки по CHUNK_SIZE байт."""
+    buffer = []
+    size = 0
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(db, name: str, fmt: str, fields: list = None, filter: dict = None,
+           gzip: bool = False):
+    """Генератор байтов выгрузки коллекции name в формате fmt."""
+    projection = dict.fromkeys(fields, 1) if fields else {}
+    projection['_id'] = 0
+    if fmt == 'geojson' and fields:
+        projection['OBJECTID'] = 1
+        if name == BUILDINGS_COLLECTION:
+            projection['geometry'] = 1
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown format: {fmt}')
+    collection = db.get_collection(name)
+    if fmt != 'geojson' and not fields:
+        fields = _columns(collection, filter or {})
+    cursor = collection.find(filter or {}, projection, batch_size=BATCH_SIZE)
+    batches = _batches(cursor)
+    if fmt == 'csv':
+        parts = _csv(batches, fields)
+    elif fmt == 'geojson':
+        parts = _geojson(db, name, batches)
+    else:
+        parts = _parquet(batches, fields)
+    chunks = _chunked(parts)
+    return _gzipped(chunks) if gzip else chunks
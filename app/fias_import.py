@@ -0,0 +1,219 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from pymongo import InsertOne, ReplaceOne
+
+from app.mongodb_connection import BoD_db
+
+try:
+    from lxml import etree
+except ImportError:
+    import xml.etree.ElementTree as etree
+
+# Импорт выгрузки ГАР ФИАС (XML) в коллекции BoD. Файлы читаются потоково
+# (iterparse) с очисткой уже разобранных элементов, так что память не
+# зависит от размера файла. Из региональных файлов берётся только
+# поддерево Димитровграда (по OKTMO в MUN_HIERARCHY) и его предки.
+# Файлы обрабатываются параллельно, по процессу на файл.
+
+CITY_OKTMO = '73705000001'
+REGION_CODE = '73'
+BATCH_SIZE = 10000
+STATE_COLLECTION = 'fias_state'
+IMPORT_SUFFIX = '_import'
+
+# Имя таблицы ГАР -> (коллекция BoD, тег записи, фильтровать по городу)
+TABLES = {
+    'ADDR_OBJ': ('addrobj', 'OBJECT', True),
+    'HOUSES': ('houses', 'HOUSE', True),
+    'MUN_HIERARCHY': ('munhierarchy', 'ITEM', True),
+    'ADDR_OBJ_PARAMS': ('addrobjparams', 'PARAM', True),
+    'HOUSES_PARAMS': ('housesparams', 'PARAM', True),
+    'PARAM_TYPES': ('paramtypes', 'PARAMTYPE', False),
+    'HOUSE_TYPES': ('housetypes', 'HOUSETYPE', False),
+    'OBJECT_LEVELS': ('objectlevels', 'OBJECTLEVEL', False),
+}
+
+_FILE_NAME = re.compile(r'^AS_([A-Z_]+?)_(\d{8})_.*\.XML$', re.IGNORECASE)
+
+
+def find_files(path: str, region: str = REGION_CODE):
+    """({таблица ГАР: путь к файлу}, версия выгрузки) по каталогу выгрузки.
+    Справочники лежат в корне, данные — в подкаталоге региона; каталоги
+    других регионов пропускаются."""
+    files = {}
+    version = None
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [name for name in dirs
+                   if not name.isdigit() or name == region]
+        for name in names:
+            match = _FILE_NAME.match(name)
+            if match is None or match.group(1).upper() not in TABLES:
+                continue
+            files[match.group(1).upper()] = os.path.join(root, name)
+            version = max(version or '', match.group(2))
+    return files, version
+
+
+def iter_records(path: str, tag: str):
+    """Атрибуты каждой записи <tag .../> как dict, без накопления дерева."""
+    context = etree.iterparse(path, events=('start', 'end'))
+    root = None
+    for event, elem in context:
+        if root is None:
+            root = elem
+        if event == 'end' and elem.tag == tag:
+            yield dict(elem.attrib)
+            root.clear()
+
+
+def city_objectids(mun_hierarchy_path: str, oktmo: str = CITY_OKTMO) -> set:
+    """OBJECTID всех объектов города и их предков (по PATH)."""
+    objectids = set()
+    for item in iter_records(mun_hierarchy_path, 'ITEM'):
+        if item.get('OKTMO') == oktmo:
+            objectids.update(item.get('PATH', item['OBJECTID']).split('.'))
+    return objectids
+
+
+def import_file(path: str, collection_name: str, tag: str,
+                objectids: set = None) -> int:
+    """Записать файл в коллекцию пачками по BATCH_SIZE (unordered)."""
+    collection = BoD_db().get_collection(collection_name)
+    count = 0
+    batch = []
+    for record in iter_records(path, tag):
+        if objectids is not None and record.get('OBJECTID') not in objectids:
+            continue
+        batch.append(InsertOne(record))
+        if len(batch) == BATCH_SIZE:
+            collection.bulk_write(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        collection.bulk_write(batch, ordered=False)
+        count += len(batch)
+    return count
+
+
+def import_fias(path: str, oktmo: str = CITY_OKTMO, workers: int = None) -> dict:
+    """Полный импорт выгрузки ГАР из каталога path. Каждая коллекция
+    собирается во временную и подменяется через rename, так что сайт не
+    видит наполовину загруженных данных."""
+    files, version = find_files(path)
+    if 'MUN_HIERARCHY' not in files:
+        raise FileNotFoundError(f'AS_MUN_HIERARCHY_*.XML not found in {path}')
+    objectids = city_objectids(files['MUN_HIERARCHY'], oktmo)
+
+    db = BoD_db()
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for table, file_path in files.items():
+            collection_name, tag, by_city = TABLES[table]
+            db.get_collection(collection_name + IMPORT_SUFFIX).drop()
+            jobs[collection_name] = pool.submit(
+                import_file, file_path, collection_name + IMPORT_SUFFIX, tag,
+                objectids if by_city else None)
+        counts = {name: job.result() for name, job in jobs.items()}
+
+    for collection_name in counts:
+        tmp = db.get_collection(collection_name + IMPORT_SUFFIX)
+        if counts[collection_name]:
+            tmp.rename(collection_name, dropTarget=True)
+        else:
+            tmp.drop()
+    db.get_collection(STATE_COLLECTION).replace_one(
+        {'_id': 'version'},
+        {'_id': 'version', 'value': version, 'oktmo': oktmo, 'mode': 'full'},
+        upsert=True)
+    return counts
+
+
+# Дельты ГАР (ежедневные/еженедельные выгрузки изменений): те же файлы,
+# но только изменённые записи. Записи upsert'ятся по ID, так что повторное
+# применение ничего не меняет; уже применённая версия пропускается целиком.
+
+# Поле, по которому запись однозначна
+KEY_FIELDS = {table: 'ID' for table in TABLES}
+KEY_FIELDS['OBJECT_LEVELS'] = 'LEVEL'
+# Таблицы с версиями объекта: у OBJECTID должна остаться одна активная строка
+VERSIONED = ['addrobj', 'houses', 'munhierarchy']
+
+
+def upsert_file(path: str, collection_name: str, tag: str, key: str,
+                objectids: set = None) -> list:
+    """Upsert записей файла пачками по BATCH_SIZE. Возвращает OBJECTID
+    затронутых объектов (для справочников — пустой список)."""
+    collection = BoD_db().get_collection(collection_name)
+    affected = set()
+    active = {}
+    batch = []
+
+    def flush():
+        if batch:
+            collection.bulk_write(batch, ordered=False)
+            batch.clear()
+
+    for record in iter_records(path, tag):
+        if objectids is not None and record.get('OBJECTID') not in objectids:
+            continue
+        batch.append(ReplaceOne({key: record[key]}, record, upsert=True))
+        if 'OBJECTID' in record:
+            affected.add(record['OBJECTID'])
+            if record.get('ISACTIVE') == '1':
+                active[record['OBJECTID']] = record[key]
+        if len(batch) == BATCH_SIZE:
+            flush()
+    flush()
+
+    if collection_name in VERSIONED and active:
+        # Новая активная версия объекта гасит все прежние
+        items = list(active.items())
+        for i in range(0, len(items), BATCH_SIZE):
+            part = dict(items[i:i+BATCH_SIZE])
+            collection.update_many(
+                {'OBJECTID': {'$in': list(part)}, 'ISACTIVE': '1',
+                 key: {'$nin': list(part.values())}},
+                {'$set': {'ISACTIVE': '0'}})
+    return sorted(affected)
+
+
+def apply_delta(path: str, oktmo: str = CITY_OKTMO, workers: int = None) -> dict:
+    """Применить дельту ГАР из каталога path. Возвращает
+    {'version', 'applied', 'counts', 'objectids'}; objectids — затронутые
+    объекты для обновления *_view, search и кэшей."""
+    files, version = find_files(path)
+    if not files or version is None:
+        raise FileNotFoundError(f'AS_*.XML not found in {path}')
+    db = BoD_db()
+    state = db.get_collection(STATE_COLLECTION).find_one({'_id': 'version'})
+    if state is not None and state.get('value') and version <= state['value']:
+        return {'version': version, 'applied': False, 'counts': {},
+                'objectids': []}
+
+    # Город — это то, что уже загружено, плюс новые объекты из дельты
+    objectids = set(db.munhierarchy.distinct('OBJECTID'))
+    if 'MUN_HIERARCHY' in files:
+        objectids |= city_objectids(files['MUN_HIERARCHY'], oktmo)
+
+    jobs = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for table, file_path in files.items():
+            collection_name, tag, by_city = TABLES[table]
+            jobs[collection_name] = pool.submit(
+                upsert_file, file_path, collection_name, tag,
+                KEY_FIELDS[table], objectids if by_city else None)
+        results = {name: job.result() for name, job in jobs.items()}
+
+    affected = set()
+    for ids in results.values():
+        affected.update(ids)
+    db.get_collection(STATE_COLLECTION).update_one(
+        {'_id': 'version'},
+        {'$set': {'value': version, 'oktmo': oktmo, 'mode': 'delta'},
+         '$push': {'applied': version}},
+        upsert=True)
+    return {'version': version, 'applied': True,
+            'counts': {name: len(ids) for name, ids in results.items()},
+            'objectids': sorted(affected)}
@@ -1,7 +1,3 @@
-from ast import Pass
-
-from django.shortcuts import render
-from flask_login import user_accessed
 from flask_wtf import FlaskForm
 from wtforms import (PasswordField, RadioField, SelectField, StringField,
                      SubmitField)
@@ -28,7 +24,7 @@ class RegisterForm(FlaskForm):
 
 class SearchForm(FlaskForm):
     search = StringField('Search', validators=[DataRequired(
-        "Поле необходимо заполнить!")], default='Search', render_kw={'class': 'btn btn-success btn-block'})
+        "Поле необходимо заполнить!")], render_kw={'class': 'btn btn-success btn-block', 'placeholder': 'Search'})
     submit = SubmitField('Search', render_kw={
                          'class': 'btn btn-success btn-block'})
 
@@ -41,5 +37,5 @@ class FilterForm(FlaskForm):
 
 
 class LengthSelector(FlaskForm):
-    selector = SelectField('Select', choices=[12, 24, 48, 96], render_kw={
+    selector = SelectField('Select', choices=[12, 24, 48, 96], coerce=int, render_kw={
                            'class': 'btn btn-success btn-block'})
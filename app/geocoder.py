@@ -0,0 +1,106 @@
+import re
+
+from app.buildings import BUILDINGS_COLLECTION
+from app.linkage import address_key, parse_address
+from app.materialize import HOUSE_VIEW
+
+# Локальный геокодер вместо dadata: адрес разбирается и нормализуется
+# так же, как в app/linkage.py, и ищется в словаре, собранном в памяти
+# из домов ФИАС (house_view) и центроидов зданий OSM. Сеть не нужна,
+# весь город геокодируется за секунды.
+
+# qc — качество совпадения, как у dadata: 0 — точно, 1 — дом без
+# литеры/корпуса, 2 — только улица, 3 — не найдено
+QC_EXACT = 0
+QC_HOUSE_BASE = 1
+QC_STREET = 2
+QC_NOT_FOUND = 3
+
+
+def _house_base(house: str) -> str:
+    match = re.match(r'\d+', house)
+    return match.group(0) if match else house
+
+
+class Geocoder:
+
+    def __init__(self, houses: list, buildings: list):
+        """houses — документы house_view (+ OBJECTGUID), buildings —
+        документы buildings (key, centroid, адресные теги, OBJECTID)."""
+        self.by_key = {}
+        self.by_base = {}
+        self.by_street = {}
+        self.by_guid = {}
+
+        points_by_objectid = {}
+        points_by_key = {}
+        for building in buildings:
+            lon, lat = building['centroid']['coordinates']
+            if building.get('OBJECTID'):
+                points_by_objectid[building['OBJECTID']] = (lat, lon)
+            if building.get('addr:street') and building.get('addr:housenumber'):
+                points_by_key[address_key(building['addr:street'],
+                                          building['addr:housenumber'])] = (lat, lon)
+
+        for house in houses:
+            if not house.get('HOUSENUM') or not house.get('PARENT_1_NAME'):
+                continue
+            key = address_key(house.get('PARENT_1_TYPENAME', '') + ' ' +
+                              house['PARENT_1_NAME'], house['HOUSENUM'])
+            point = points_by_objectid.get(house['OBJECTID']) or \
+                points_by_key.get(key)
+            result = {
+                'value': house.get('FULL_ADDRESS'),
+                'fias_objectid': house['OBJECTID'],
+                'house_fias_id': house.get('OBJECTGUID'),
+                'geo_lat': point[0] if point else None,
+                'geo_lon': point[1] if point else None,
+            }
+            self.by_key.setdefault(key, result)
+            self.by_base.setdefault(key[:2] + (_house_base(key[2]),), result)
+            if point:
+                self.by_street.setdefault(key[:2], []).append(point)
+            if result['house_fias_id']:
+                self.by_guid[result['house_fias_id']] = result
+
+    @classmethod
+    def from_db(cls, db):
+        guids = {house['OBJECTID']: house.get('OBJECTGUID')
+                 for house in db.houses.find({'ISACTIVE': '1'},
+                                             {'OBJECTID': 1, 'OBJECTGUID': 1})}
+        houses = []
+        for house in db.get_collection(HOUSE_VIEW).find(
+                {}, {'OBJECTID': 1, 'HOUSENUM': 1, 'PARENT_1_NAME': 1,
+                     'PARENT_1_TYPENAME': 1, 'FULL_ADDRESS': 1}):
+            house['OBJECTGUID'] = guids.get(house['OBJECTID'])
+            houses.append(house)
+        buildings = list(db.get_collection(BUILDINGS_COLLECTION).find(
+            {}, {'centroid': 1, 'OBJECTID': 1, 'addr:street': 1,
+                 'addr:housenumber': 1}))
+        return cls(houses, buildings)
+
+    def geocode(self, address: str) -> dict:
+        """Адрес вида 'г. Димитровград, ул. Ленина, д. 12' -> dict в духе
+        ответа dadata.clean (value, house_fias_id, geo_lat, geo_lon, qc)."""
+        key = parse_address(address)
+        if key is None:
+            return {'source': address, 'qc': QC_NOT_FOUND}
+        if key in self.by_key:
+            return dict(self.by_key[key], source=address, qc=QC_EXACT)
+        base = key[:2] + (_house_base(key[2]),)
+        if base in self.by_base:
+            return dict(self.by_base[base], source=address, qc=QC_HOUSE_BASE)
+        points = self.by_street.get(key[:2])
+        if points:
+            return {'source': address, 'qc': QC_STREET,
+                    'geo_lat': sum(point[0] for point in points) / len(points),
+                    'geo_lon': sum(point[1] for point in points) / len(points)}
+        return {'source': address, 'qc': QC_NOT_FOUND}
+
+    def geocode_many(self, addresses: list) -> list:
+        return [self.geocode(address) for address in addresses]
+
+    def find_by_id(self, house_fias_id: str):
+        """Замена dadata.find_by_id('address', код): dict или None."""
+        result = self.by_guid.get(house_fias_id)
+        return None if result is None else dict(result, qc=QC_EXACT)
@@ -0,0 +1,141 @@
+from pymongo import ASCENDING, IndexModel
+
+from app.buildings import BUILDINGS_COLLECTION, create_buildings_indexes
+from app.linkage import HOUSE_FACTS
+from app.materialize import ADDROBJ_VIEW, HOUSE_VIEW, create_view_indexes
+from app.search import SEARCH_COLLECTION, create_search_indexes
+from app.stats import HOUSE_STATS
+
+# Индексы под все запросы из app/models.py, app/search.py и постраничный
+# вывод. create_index идемпотентен: существующий индекс не пересоздаётся.
+
+INDEXES = {
+    'addrobj': [
+        [('ID', ASCENDING)],
+        [('OBJECTID', ASCENDING), ('ISACTIVE', ASCENDING)],
+        [('ISACTIVE', ASCENDING), ('OBJECTID', ASCENDING)],
+        [('ISACTIVE', ASCENDING), ('_id', ASCENDING)],
+        [('UPDATEDATE', ASCENDING)],
+    ],
+    'houses': [
+        [('ID', ASCENDING)],
+        [('OBJECTID', ASCENDING), ('ISACTIVE', ASCENDING)],
+        [('ISACTIVE', ASCENDING), ('OBJECTID', ASCENDING)],
+        [('ISACTIVE', ASCENDING), ('_id', ASCENDING)],
+        [('UPDATEDATE', ASCENDING)],
+    ],
+    'munhierarchy': [
+        [('ID', ASCENDING)],
+        [('OBJECTID', ASCENDING), ('ISACTIVE', ASCENDING)],
+        [('PARENTOBJID', ASCENDING), ('OBJECTID', ASCENDING)],
+        [('ISACTIVE', ASCENDING), ('_id', ASCENDING)],
+        [('UPDATEDATE', ASCENDING)],
+    ],
+    'addrobjparams': [
+        [('ID', ASCENDING)],
+        [('OBJECTID', ASCENDING)],
+        [('UPDATEDATE', ASCENDING)],
+    ],
+    'housesparams': [
+        [('ID', ASCENDING)],
+        [('OBJECTID', ASCENDING)],
+        [('UPDATEDATE', ASCENDING)],
+    ],
+    'paramtypes': [
+        [('ID', ASCENDING)],
+    ],
+    'housetypes': [
+        [('ID', ASCENDING)],
+    ],
+    'objectlevels': [
+        [('LEVEL', ASCENDING)],
+    ],
+}
+
+# Формы запросов (коллекция, фильтр, сортировка), которые делают модели.
+# Для $lookup/$graphLookup проверяем эквивалентный find по внешней коллекции.
+QUERY_SHAPES = [
+    ('houses', {'OBJECTID': {'$in': ['1']}, 'ISACTIVE': '1'}, None),
+    ('housetypes', {'ID': '1'}, None),
+    ('munhierarchy', {'OBJECTID': '1', 'ISACTIVE': '1'}, None),
+    ('munhierarchy', {'PARENTOBJID': {'$in': ['1']}}, None),
+    ('housesparams', {'OBJECTID': '1'}, None),
+    ('addrobj', {'OBJECTID': {'$in': ['1']}, 'ISACTIVE': '1'}, None),
+    ('addrobjparams', {'OBJECTID': '1'}, None),
+    ('objectlevels', {'LEVEL': {'$in': ['1']}}, None),
+    ('paramtypes', {'ID': {'$in': ['1']}}, None),
+    ('addrobj', {'$and': [{'ISACTIVE': '1'}, {'OBJECTID': {'$gt': '1'}}]},
+     {'OBJECTID': 1}),
+    ('addrobj', {'ISACTIVE': {'$in': ['1', 'true']}}, {'_id': 1}),
+    ('houses', {'ISACTIVE': {'$in': ['1', 'true']}}, {'_id': 1}),
+    (HOUSE_VIEW, {'OBJECTID': '1'}, None),
+    (ADDROBJ_VIEW, {'OBJECTID': '1'}, None),
+    ('houses', {'UPDATEDATE': {'$gt': '2000-01-01'}}, None),
+    (BUILDINGS_COLLECTION, {'OBJECTID': {'$in': ['1']}}, None),
+    (HOUSE_FACTS, {'OBJECTID': {'$in': ['1']}}, None),
+    (BUILDINGS_COLLECTION, {'geometry': {'$geoIntersects': {'$geometry': {
+        'type': 'Polygon', 'coordinates': [[[49.5, 54.2], [49.6, 54.2],
+                                            [49.6, 54.3], [49.5, 54.2]]]}}}},
+     None),
+    (SEARCH_COLLECTION, {'$and': [{'KEYS': {'$regex': '^лен'}},
+                                  {'KIND': 'houses'}]}, {'_id': 1}),
+    ('houses', {'$and': [{'ISACTIVE': '1'}, {'OBJECTID': {'$gt': '1'}}]},
+     {'OBJECTID': 1}),
+    # house_stats: индексы создаёт rebuild_stats
+    (HOUSE_STATS, {'OBJECTID': {'$in': ['1']}}, None),
+    (HOUSE_STATS, {}, {'OBJECTID': 1}),
+    (HOUSE_STATS, {'$and': [{'STREET_ID': '1'}, {'OBJECTID': {'$gt': '1'}}]},
+     {'OBJECTID': 1}),
+    (HOUSE_STATS, {'$and': [{'DISTRICT': '1'}, {'OBJECTID': {'$gt': '1'}}]},
+     {'OBJECTID': 1}),
+    (HOUSE_STATS, {'YEAR': {'$gte': 1950, '$lte': 1970}}, {'OBJECTID': 1}),
+]
+
+
+def _index_names(db, collections: list) -> set:
+    return {f'{name}.{index}' for name in collections
+            for index in db.get_collection(name).index_information()
+            if index != '_id_'}
+
+
+def create_indexes(db) -> list:
+    """Создать все индексы. Возвращает имена ('коллекция.индекс') только
+    тех, которых раньше не было."""
+    collections = list(INDEXES) + [SEARCH_COLLECTION, HOUSE_VIEW,
+                                   ADDROBJ_VIEW, BUILDINGS_COLLECTION]
+    before = _index_names(db, collections)
+    for collection, indexes in INDEXES.items():
+        db.get_collection(collection).create_indexes(
+            [IndexModel(keys) for keys in indexes])
+    create_search_indexes(db.get_collection(SEARCH_COLLECTION))
+    create_view_indexes(db)
+    create_buildings_indexes(db.get_collection(BUILDINGS_COLLECTION))
+    return sorted(_index_names(db, collections) - before)
+
+
+def _stages(plan) -> list:
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages += _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages += _stages(value)
+    return stages
+
+
+def check_query_plans(db) -> list:
+    """Прогоняет explain() по всем QUERY_SHAPES. Возвращает список
+    (коллекция, фильтр, стадии плана) для запросов с COLLSCAN."""
+    failures = []
+    for collection, filter, sort in QUERY_SHAPES:
+        command = {'find': collection, 'filter': filter}
+        if sort:
+            command['sort'] = sort
+        explain = db.command('explain', command, verbosity='queryPlanner')
+        stages = _stages(explain['queryPlanner']['winningPlan'])
+        if 'COLLSCAN' in stages:
+            failures.append((collection, filter, stages))
+    return failures
@@ -0,0 +1,251 @@
+import csv
+import datetime
+import re
+
+from pymongo import ASCENDING, IndexModel, UpdateOne
+
+from app.buildings import BUILDINGS_COLLECTION, CHANGES_COLLECTION
+from app.materialize import HOUSE_VIEW
+
+# Сопоставление домов ФИАС, данных dom.mingkh.ru и зданий OSM. Вместо
+# вложенных циклов (как в ноутбуке) строим хэш-индекс по ключу — коду
+# ФИАС или нормализованному адресу (тип улицы, название, номер дома) —
+# и проходим каждый источник один раз.
+
+STREET_TYPES = {
+    'ул': 'ул', 'улица': 'ул',
+    'пр-кт': 'пр-кт', 'проспект': 'пр-кт', 'пр': 'пр-кт', 'пркт': 'пр-кт',
+    'пер': 'пер', 'переулок': 'пер',
+    'пр-д': 'проезд', 'проезд': 'проезд',
+    'б-р': 'б-р', 'бульвар': 'б-р',
+    'ш': 'ш', 'шоссе': 'ш',
+    'пл': 'пл', 'площадь': 'пл',
+    'наб': 'наб', 'набережная': 'наб',
+    'туп': 'туп', 'тупик': 'туп',
+    'мкр': 'мкр', 'микрорайон': 'мкр',
+    'тер': 'тер', 'территория': 'тер',
+}
+# Результат сопоставления по дому ФИАС: год, площадь и этажность из
+# mingkh и ключ здания OSM. Хранится отдельно от buildings, потому что
+# у многих домов из mingkh нет контура в OSM.
+HOUSE_FACTS = 'house_facts'
+FACT_FIELDS = ['year', 'area', 'floors']
+# Латинские буквы, похожие на кириллические (12a vs 12а)
+LATIN_TO_CYRILLIC = str.maketrans('abcekmhoptxy', 'абсекмнортху')
+HOUSE_PREFIXES = re.compile(r'^(дом|здание|зд|д)\.?\s*')
+HOUSE_PARTS = [(re.compile(r'\s*(корпус|корп\.?|к\.?)\s*'), 'к'),
+               (re.compile(r'\s*(строение|стр\.?|с\.?)\s*'), 'с')]
+
+
+def _clean(text) -> str:
+    return str(text or '').lower().replace('ё', 'е').strip()
+
+
+def normalize_street(street) -> tuple:
+    """'улица Ленина' / 'ул. Ленина' / 'Ленина ул' -> ('ул', 'ленина')."""
+    words = [word for word in re.split(r'[\s.,]+', _clean(street)) if word]
+    street_type = ''
+    name = []
+    for word in words:
+        if not street_type and word in STREET_TYPES:
+            street_type = STREET_TYPES[word]
+        else:
+            name.append(word)
+    return street_type, ' '.join(name)
+
+
+def normalize_house(house) -> str:
+    """'д. 12 А' / '12а' -> '12а'; корпус и строение — 'к' и 'с'."""
+    house = HOUSE_PREFIXES.sub('', _clean(house))
+    for pattern, short in HOUSE_PARTS:
+        house = pattern.sub(short, house)
+    return re.sub(r'\s+', '', house).translate(LATIN_TO_CYRILLIC)
+
+
+def address_key(street, house) -> tuple:
+    street_type, name = normalize_street(street)
+    return street_type, name, normalize_house(house)
+
+
+def parse_address(address: str) -> tuple:
+    """'ул. Ленина, д. 12' -> ключ адреса; город в начале отбрасывается."""
+    parts = [part.strip() for part in str(address).split(',') if part.strip()]
+    parts = [part for part in parts if not part.lower().startswith(('г.', 'г '))]
+    if len(parts) < 2:
+        return None
+    return address_key(parts[-2], parts[-1])
+
+
+def build_index(records: list, key) -> dict:
+    """{ключ: [записи]}; записи без ключа (None) в индекс не попадают."""
+    index = {}
+    for record in records:
+        value = key(record)
+        if value is not None:
+            index.setdefault(value, []).append(record)
+    return index
+
+
+def link(left: list, right: list, left_key, right_key) -> dict:
+    """Линейное соединение двух списков по ключу. Возвращает
+    {'matched': [(l, r)], 'ambiguous': [(l, [r...])],
+     'unmatched_left': [...], 'unmatched_right': [...]}."""
+    index = build_index(right, right_key)
+    used = set()
+    result = {'matched': [], 'ambiguous': [],
+              'unmatched_left': [], 'unmatched_right': []}
+    for record in left:
+        value = left_key(record)
+        candidates = index.get(value, []) if value is not None else []
+        if len(candidates) == 1:
+            result['matched'].append((record, candidates[0]))
+            used.add(id(candidates[0]))
+        elif candidates:
+            result['ambiguous'].append((record, candidates))
+            used.update(id(candidate) for candidate in candidates)
+        else:
+            result['unmatched_left'].append(record)
+    result['unmatched_right'] = [record for record in right
+                                 if id(record) not in used]
+    return result
+
+
+def _fias_key(house: dict):
+    if not house.get('HOUSENUM') or not house.get('PARENT_1_NAME'):
+        return None
+    return address_key(house.get('PARENT_1_TYPENAME', '') + ' ' +
+                       house['PARENT_1_NAME'], house['HOUSENUM'])
+
+
+def _osm_key(building: dict):
+    if not building.get('addr:street') or not building.get('addr:housenumber'):
+        return None
+    return address_key(building['addr:street'], building['addr:housenumber'])
+
+
+def _mingkh_key(record: dict):
+    return parse_address(record['address'])
+
+
+def mingkh_records(table: dict) -> list:
+    """Таблица crawl_mingkh ({n: [адрес, площадь, год, этажи]}) -> записи."""
+    records = []
+    for number, row in table.items():
+        row = list(row) + [None] * (4 - len(row))
+        records.append({'n': number, 'address': row[0], 'area': row[1],
+                        'year': row[2], 'floors': row[3]})
+    return records
+
+
+def link_houses(fias: list, mingkh: list, osm: list) -> dict:
+    """Сопоставить дома ФИАС (документы house_view) с записями mingkh и
+    зданиями OSM. Возвращает {'houses': {OBJECTID: данные},
+    'mingkh': отчёт link(), 'osm': отчёт link()}."""
+    houses = {house['OBJECTID']: {'OBJECTID': house['OBJECTID'],
+                                  'FULL_ADDRESS': house.get('FULL_ADDRESS')}
+              for house in fias}
+
+    by_fias_id = {}
+    for house in fias:
+        if house.get('OBJECTGUID'):
+            by_fias_id[house['OBJECTGUID']] = house
+    # Записи с кодом ФИАС (после dadata) сопоставляем по нему, остальные —
+    # по адресу
+    with_id = [record for record in mingkh
+               if record.get('house_fias_id') in by_fias_id]
+    without_id = [record for record in mingkh
+                  if record.get('house_fias_id') not in by_fias_id]
+    mingkh_report = link(without_id, fias, _mingkh_key, _fias_key)
+    mingkh_report['matched'] += [(record, by_fias_id[record['house_fias_id']])
+                                 for record in with_id]
+    for record, house in mingkh_report['matched']:
+        houses[house['OBJECTID']].update(
+            {field: record[field] for field in ['year', 'area', 'floors']
+             if record.get(field)})
+
+    osm_report = link(osm, fias, _osm_key, _fias_key)
+    for building, house in osm_report['matched']:
+        houses[house['OBJECTID']]['building_key'] = building['key']
+    return {'houses': houses, 'mingkh': mingkh_report, 'osm': osm_report}
+
+
+def write_reports(result: dict, path_prefix: str) -> list:
+    """Несопоставленные и неоднозначные записи в CSV (вместо error_data)."""
+    paths = []
+    for source in ['mingkh', 'osm']:
+        report = result[source]
+        rows = [dict(record, reason='unmatched')
+                for record in report['unmatched_left']]
+        rows += [dict(record, reason='ambiguous',
+                      candidates=' '.join(c['OBJECTID'] for c in candidates))
+                 for record, candidates in report['ambiguous']]
+        path = f'{path_prefix}{source}_unmatched.csv'
+        fields = sorted({key for row in rows for key in row
+                         if key not in ('geometry', 'centroid', '_id')})
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fields, extrasaction='ignore',
+                                    delimiter=';')
+            writer.writeheader()
+            writer.writerows(rows)
+        paths.append(path)
+    return paths
+
+
+def write_facts(db, houses: dict) -> int:
+    """Переписать house_facts из link_houses()['houses'] (временная
+    коллекция + rename). Дома без данных не пишутся."""
+    tmp = db.get_collection(HOUSE_FACTS + '_tmp')
+    tmp.drop()
+    facts = []
+    for house in houses.values():
+        fact = {field: house[field] for field in FACT_FIELDS + ['building_key']
+                if house.get(field)}
+        if fact:
+            facts.append(dict(fact, OBJECTID=house['OBJECTID']))
+    if not facts:
+        db.get_collection(HOUSE_FACTS).drop()
+        return 0
+    tmp.insert_many(facts)
+    tmp.create_indexes([IndexModel([('OBJECTID', ASCENDING)], unique=True)])
+    tmp.rename(HOUSE_FACTS, dropTarget=True)
+    return len(facts)
+
+
+def load_and_link(db, mingkh: list) -> dict:
+    """Сопоставить дома из house_view, buildings и mingkh. Год, площадь
+    и этажность по OBJECTID пишутся в house_facts, а в связанные здания
+    buildings — ещё и OBJECTID ФИАС (для карты)."""
+    guids = {house['OBJECTID']: house.get('OBJECTGUID')
+             for house in db.houses.find({'ISACTIVE': '1'},
+                                         {'OBJECTID': 1, 'OBJECTGUID': 1})}
+    fias = []
+    for house in db.get_collection(HOUSE_VIEW).find(
+            {}, {'OBJECTID': 1, 'HOUSENUM': 1, 'PARENT_1_NAME': 1,
+                 'PARENT_1_TYPENAME': 1, 'FULL_ADDRESS': 1}):
+        house['OBJECTGUID'] = guids.get(house['OBJECTID'])
+        fias.append(house)
+    osm = list(db.get_collection(BUILDINGS_COLLECTION).find(
+        {}, {'key': 1, 'bbox': 1, 'addr:street': 1, 'addr:housenumber': 1}))
+
+    result = link_houses(fias, mingkh, osm)
+    write_facts(db, result['houses'])
+    bboxes = {building['key']: building['bbox'] for building in osm}
+    updates = []
+    changes = []
+    for house in result['houses'].values():
+        if 'building_key' not in house:
+            continue
+        fields = {'OBJECTID': house['OBJECTID']}
+        for field in FACT_FIELDS:
+            if house.get(field):
+                fields[field] = house[field]
+        updates.append(UpdateOne({'key': house['building_key']},
+                                 {'$set': fields}))
+        changes.append(bboxes[house['building_key']])
+    if updates:
+        db.get_collection(BUILDINGS_COLLECTION).bulk_write(updates,
+                                                           ordered=False)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        db.get_collection(CHANGES_COLLECTION).insert_many(
+            [{'bbox': bbox, 'at': now} for bbox in changes])
+    return result
@@ -1,14 +1,68 @@
-import folium
+import re
+import threading
 
-class Map:
-    def __init__(self) -> folium.Map():
-        pass
+from app.metrics import timed
 
+# Базовая карта (подложка) не зависит от данных, поэтому собираем её
+# один раз на процесс и держим HTML в памяти вместо folium.Map().save()
+# на каждый запрос. Слои с данными отдаются отдельно (/api/data и т.п.).
 
-    def get_map():
-        map = folium.Map().render
-        return map
-    
+MAP_OPTIONS = {
+    'location': [54.217044, 49.603082],
+    'zoom_start': 12,
+    'zoom_control': False,
+    'width': '100%',
+    'height': '100%',
+    'left': '0%',
+    'top': '0%',
+    'position': 'sticky',
+}
 
-    def show_map(map):
-        pass
\ No newline at end of file
+_base_map = None
+_lock = threading.Lock()
+
+
+class BaseMap:
+
+    def __init__(self, html: str, name: str):
+        self.html = html
+        self.name = name
+
+
+def _stable_ids(html: str, name: str):
+    # folium даёт элементам случайные uuid; заменяем их на порядковые
+    # номера, чтобы HTML (и ETag страницы) совпадал во всех воркерах
+    ids = {}
+
+    def replace(match):
+        return ids.setdefault(match.group(0), str(len(ids)))
+
+    pattern = re.compile(r'(?<=_)[0-9a-f]{32}\b')
+    html = pattern.sub(replace, html)
+    return html, pattern.sub(replace, name)
+
+
+def build_base_map() -> BaseMap:
+    import folium
+    with timed('base_map'):
+        fol_map = folium.Map(**MAP_OPTIONS)
+        html, name = _stable_ids(fol_map.get_root().render(), fol_map.get_name())
+    return BaseMap(html, name)
+
+
+def get_base_map() -> BaseMap:
+    global _base_map
+    if _base_map is None:
+        with _lock:
+            if _base_map is None:
+                _base_map = build_base_map()
+    return _base_map
+
+
+def rebuild_base_map() -> BaseMap:
+    """Пересобрать подложку (например, после смены MAP_OPTIONS/данных)."""
+    global _base_map
+    base_map = build_base_map()
+    with _lock:
+        _base_map = base_map
+    return base_map
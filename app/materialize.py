@@ -0,0 +1,175 @@
+from pymongo import ASCENDING, DeleteMany, IndexModel, InsertOne, ReplaceOne
+
+from app.models import Addrobj, House, get_data_many
+
+# Готовые (денормализованные) документы для страниц дома и адресного
+# объекта: ровно то, что возвращают House.get_data и Addrobj.get_data.
+# Первый запуск собирает всё, дальше пересобираются только объекты,
+# чьи исходные строки изменились с прошлого запуска.
+
+HOUSE_VIEW = 'house_view'
+ADDROBJ_VIEW = 'addrobj_view'
+STATE_COLLECTION = 'views_state'
+BATCH_SIZE = 500
+# House.get_data поднимается на 3 уровня вверх, поэтому изменение
+# адресного объекта задевает потомков до 3 уровней вниз
+DESCENDANT_DEPTH = 3
+
+SOURCES = ['addrobj', 'houses', 'munhierarchy', 'addrobjparams',
+           'housesparams']
+# Изменение справочника задевает все документы — тогда полная пересборка
+REFERENCES = ['paramtypes', 'housetypes', 'objectlevels']
+
+
+def create_view_indexes(db):
+    for name in [HOUSE_VIEW, ADDROBJ_VIEW]:
+        db.get_collection(name).create_indexes(
+            [IndexModel([('OBJECTID', ASCENDING)], unique=True)])
+
+
+def _watermarks(db) -> dict:
+    """Максимальные _id и UPDATEDATE по каждой исходной коллекции."""
+    marks = {}
+    for name in SOURCES + REFERENCES:
+        coll = db.get_collection(name)
+        mark = {}
+        last = coll.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+        if last is not None:
+            mark['_id'] = last['_id']
+        last = coll.find_one({'UPDATEDATE': {'$exists': True}},
+                             {'UPDATEDATE': 1}, sort=[('UPDATEDATE', -1)])
+        if last is not None:
+            mark['UPDATEDATE'] = last['UPDATEDATE']
+        marks[name] = mark
+    return marks
+
+
+def _changed_filter(mark: dict) -> dict:
+    conditions = []
+    if '_id' in mark:
+        conditions.append({'_id': {'$gt': mark['_id']}})
+    if 'UPDATEDATE' in mark:
+        conditions.append({'UPDATEDATE': {'$gt': mark['UPDATEDATE']}})
+    if not conditions:
+        return {}
+    return {'$or': conditions}
+
+
+def descendants(db, objectids: set) -> set:
+    found = set(objectids)
+    level = set(objectids)
+    for _ in range(DESCENDANT_DEPTH):
+        if not level:
+            break
+        level = {row['OBJECTID'] for row in db.munhierarchy.find(
+            {'PARENTOBJID': {'$in': list(level)}}, {'OBJECTID': 1})} - found
+        found |= level
+    return found
+
+
+def parents(db, objectids: set) -> set:
+    """Родители объектов: у них в addrobj_view хранится список CHILDREN.
+    Берём все версии строк munhierarchy (старые остаются с ISACTIVE='0')
+    и родителей из текущих *_view — так при переносе объекта попадают
+    и старый, и новый родитель."""
+    ids = list(objectids)
+    found = {row['PARENTOBJID'] for row in db.munhierarchy.find(
+        {'OBJECTID': {'$in': ids}}, {'PARENTOBJID': 1})}
+    for name, field in [(HOUSE_VIEW, 'PARENT_1_OBJECTID'),
+                        (ADDROBJ_VIEW, 'PARENT_OBJECTID')]:
+        found |= {row[field] for row in db.get_collection(name).find(
+            {'OBJECTID': {'$in': ids}}, {field: 1}) if field in row}
+    return found
+
+
+def _write_views(db, collection_name: str, model, objectids: list,
+                 replace: bool) -> int:
+    collection = db.get_collection(collection_name)
+    written = 0
+    for i in range(0, len(objectids), BATCH_SIZE):
+        batch = objectids[i:i+BATCH_SIZE]
+        data = get_data_many(model, batch)
+        if replace:
+            requests = [ReplaceOne({'OBJECTID': objectid}, obj, upsert=True)
+                        for objectid, obj in data.items()]
+            missing = [objectid for objectid in batch if objectid not in data]
+            if missing:
+                requests.append(DeleteMany({'OBJECTID': {'$in': missing}}))
+        else:
+            requests = [InsertOne(dict(obj)) for obj in data.values()]
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+        written += len(data)
+    return written
+
+
+def _active_ids(db, name: str, filter: dict = None) -> list:
+    query = {'ISACTIVE': '1'}
+    query.update(filter or {})
+    return [row['OBJECTID'] for row in db.get_collection(name).find(
+        query, {'OBJECTID': 1}).batch_size(BATCH_SIZE * 10)]
+
+
+def rebuild_views(db) -> dict:
+    """Полная пересборка во временные коллекции с подменой через rename.
+    Если активных объектов нет, view становится пустым; если объекты есть,
+    а документов не собралось — RuntimeError, старый view и watermarks
+    остаются как были."""
+    marks = _watermarks(db)
+    counts = {}
+    for name, source, model in [(HOUSE_VIEW, 'houses', House),
+                                (ADDROBJ_VIEW, 'addrobj', Addrobj)]:
+        tmp = db.get_collection(name + '_tmp')
+        tmp.drop()
+        objectids = _active_ids(db, source)
+        counts[name] = _write_views(db, tmp.name, model, objectids,
+                                    replace=False)
+        if counts[name]:
+            tmp.rename(name, dropTarget=True)
+        elif objectids:
+            tmp.drop()
+            raise RuntimeError(f'{name}: no documents built from '
+                               f'{len(objectids)} active {source}')
+        else:
+            db.get_collection(name).drop()
+    create_view_indexes(db)
+    db.get_collection(STATE_COLLECTION).replace_one(
+        {'_id': 'views'}, {'_id': 'views', 'watermarks': marks}, upsert=True)
+    return counts
+
+
+def refresh_views(db, objectids: list = None) -> dict:
+    """Инкрементальное обновление объектов, чьи строки в исходных
+    коллекциях изменились с прошлого запуска (по _id и UPDATEDATE), плюс
+    переданных objectids. Watermarks сдвигаются по всем коллекциям,
+    поэтому изменённые строки берутся всегда, а не только objectids.
+    Без прошлого запуска или при изменении справочника — полная сборка."""
+    state = db.get_collection(STATE_COLLECTION).find_one({'_id': 'views'})
+    if state is None:
+        return rebuild_views(db)
+
+    marks = _watermarks(db)
+    old = state['watermarks']
+    for name in REFERENCES:
+        if db.get_collection(name).find_one(
+                _changed_filter(old.get(name, {}))) is not None:
+            return rebuild_views(db)
+    changed = set(objectids or [])
+    for name in SOURCES:
+        changed |= {row['OBJECTID'] for row in db.get_collection(name).find(
+            _changed_filter(old.get(name, {})), {'OBJECTID': 1})}
+
+    affected = descendants(db, changed)
+    houses = {row['OBJECTID'] for row in db.houses.find(
+        {'OBJECTID': {'$in': list(affected)}}, {'OBJECTID': 1})}
+    # Родителям тоже нужна перезапись: у них меняется CHILDREN
+    addrobjs = (affected | parents(db, changed)) - houses
+    counts = {
+        HOUSE_VIEW: _write_views(db, HOUSE_VIEW, House,
+                                 sorted(houses), replace=True),
+        ADDROBJ_VIEW: _write_views(db, ADDROBJ_VIEW, Addrobj,
+                                   sorted(addrobjs), replace=True),
+    }
+    db.get_collection(STATE_COLLECTION).replace_one(
+        {'_id': 'views'}, {'_id': 'views', 'watermarks': marks}, upsert=True)
+    return counts
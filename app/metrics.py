@@ -0,0 +1,282 @@
+import bisect
+import contextlib
+import threading
+import time
+
+from pymongo import monitoring
+
+from config import Config
+
+# Метрики в формате Prometheus: время запросов, число и время команд
+# Mongo на запрос (с пометкой N+1), время рендеринга шаблонов. Всё
+# считается в памяти процесса и стоит пару операций со словарём на
+# событие, поэтому включено всегда. Отдаются на /metrics.
+
+PREFIX = 'bod_'
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+QUERY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+_local = threading.local()
+
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, labels: list, buckets: list = BUCKETS):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # по корзине на каждую границу + +Inf, сумма
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = {labels: list(counts) for labels, counts in self._values.items()}
+        for labels, counts in sorted(values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + ['+Inf'], counts):
+                total += count
+                lines.append(f'{self.name}_bucket'
+                             f'{_labels(self.labels, labels, le=bound)} {total}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels)} {counts[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels)} {total}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labels: list, type: str = 'counter'):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = labels
+        self.type = type
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, value: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labels, labels)} {value}')
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: list, values: tuple, le=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+request_seconds = Histogram('http_request_duration_seconds',
+                            'Время обработки запроса.',
+                            ['endpoint', 'method', 'status'])
+request_queries = Histogram('http_request_mongo_commands',
+                            'Число команд Mongo на запрос.',
+                            ['endpoint'], QUERY_BUCKETS)
+mongo_seconds = Histogram('mongo_command_duration_seconds',
+                          'Время команд Mongo.', ['command', 'collection'])
+mongo_failures = Counter('mongo_command_failures_total',
+                         'Команды Mongo, завершившиеся ошибкой.',
+                         ['command', 'collection'])
+n_plus_one = Counter('n_plus_one_total',
+                     'Запросы, в которых одна и та же команда по одной '
+                     'коллекции повторилась N_PLUS_ONE_THRESHOLD раз и больше.',
+                     ['endpoint', 'command', 'collection'])
+render_seconds = Histogram('template_render_duration_seconds',
+                           'Время рендеринга шаблонов.', ['template'])
+step_seconds = Histogram('step_duration_seconds',
+                         'Время отдельных тяжёлых шагов (folium и т.п.).',
+                         ['step'])
+slow_requests = Counter('slow_requests_total',
+                        'Запросы дольше SLOW_REQUEST_MS.', ['endpoint'])
+
+METRICS = [request_seconds, request_queries, mongo_seconds, mongo_failures,
+           n_plus_one, render_seconds, step_seconds, slow_requests]
+
+
+class RequestTrace:
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.status = 500
+        self.commands = {}
+        self.mongo_time = 0.0
+        self.render_time = 0.0
+        self._pending = {}
+        self._render_started = None
+        # Команды могут приходить и из потоков app.concurrency
+        self._lock = threading.Lock()
+
+    def breakdown(self) -> str:
+        shapes = ', '.join(f'{command} {collection} x{count} '
+                           f'({total * 1000:.1f} ms)'
+                           for (command, collection), (count, total)
+                           in sorted(self.commands.items(),
+                                     key=lambda item: -item[1][1]))
+        return (f'mongo {self.mongo_time * 1000:.1f} ms, '
+                f'render {self.render_time * 1000:.1f} ms; {shapes}')
+
+
+def current() -> RequestTrace:
+    return getattr(_local, 'trace', None)
+
+
+def last_trace() -> RequestTrace:
+    """Трасса последнего завершённого запроса в этом потоке (для
+    бенчмарков: число и время команд Mongo на запрос)."""
+    return getattr(_local, 'last_trace', None)
+
+
+def run_with_trace(trace: RequestTrace, func):
+    """Выполнить func в другом потоке от имени запроса trace."""
+    _local.trace = trace
+    try:
+        return func()
+    finally:
+        _local.trace = None
+
+
+class CommandStats(monitoring.CommandListener):
+    """Считает команды Mongo: в общие гистограммы и в трассу текущего
+    запроса (события синхронного драйвера приходят в том же потоке)."""
+
+    def started(self, event):
+        trace = current()
+        if trace is not None:
+            collection = event.command.get(event.command_name)
+            with trace._lock:
+                trace._pending[event.request_id] = \
+                    collection if isinstance(collection, str) else ''
+
+    def _finished(self, event, failed: bool):
+        trace = current()
+        collection = ''
+        if trace is not None:
+            with trace._lock:
+                collection = trace._pending.pop(event.request_id, '')
+        seconds = event.duration_micros / 1e6
+        mongo_seconds.observe(seconds, event.command_name, collection)
+        if failed:
+            mongo_failures.inc(event.command_name, collection)
+        if trace is not None:
+            key = (event.command_name, collection)
+            with trace._lock:
+                count, total = trace.commands.get(key, (0, 0.0))
+                trace.commands[key] = (count + 1, total + seconds)
+                trace.mongo_time += seconds
+
+    def succeeded(self, event):
+        self._finished(event, False)
+
+    def failed(self, event):
+        self._finished(event, True)
+
+
+command_stats = CommandStats()
+
+
+@contextlib.contextmanager
+def timed(step: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        step_seconds.observe(time.perf_counter() - started, step)
+
+
+def _before_request():
+    from flask import request
+
+    rule = request.url_rule
+    _local.trace = RequestTrace(rule.rule if rule is not None else 'unmatched')
+
+
+def _after_request(response):
+    trace = current()
+    if trace is not None:
+        trace.status = response.status_code
+    return response
+
+
+def _teardown_request(error):
+    from flask import current_app, request
+
+    trace = current()
+    _local.trace = None
+    if trace is None:
+        return
+    _local.last_trace = trace
+    seconds = time.perf_counter() - trace.started
+    request_seconds.observe(seconds, trace.endpoint, request.method,
+                            trace.status)
+    request_queries.observe(sum(count for count, _ in trace.commands.values()),
+                            trace.endpoint)
+    repeated = [key for key, (count, _) in trace.commands.items()
+                if key[0] in ('find', 'aggregate')
+                and count >= Config.N_PLUS_ONE_THRESHOLD]
+    for command, collection in repeated:
+        n_plus_one.inc(trace.endpoint, command, collection)
+    if Config.SLOW_REQUEST_MS and seconds * 1000 >= Config.SLOW_REQUEST_MS:
+        slow_requests.inc(trace.endpoint)
+        current_app.logger.warning(
+            'slow request %s %s: %.1f ms (%s)%s', request.method,
+            request.full_path.rstrip('?'), seconds * 1000, trace.breakdown(),
+            ' N+1: ' + ', '.join(' '.join(key) for key in repeated)
+            if repeated else '')
+
+
+def _before_render(sender, template, context, **extra):
+    trace = current()
+    if trace is not None:
+        trace._render_started = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    trace = current()
+    if trace is not None and trace._render_started is not None:
+        seconds = time.perf_counter() - trace._render_started
+        trace._render_started = None
+        trace.render_time += seconds
+        render_seconds.observe(seconds, template.name)
+
+
+def init_app(app):
+    from flask import before_render_template, template_rendered
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+
+def render_metrics(extra: list = ()) -> str:
+    lines = []
+    for metric in list(METRICS) + list(extra):
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
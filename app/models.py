@@ -10,160 +10,317 @@
 
 
 # ADDRESS OBJECT
+from app.cache import cached
+from app.concurrency import parallel
 from app.mongodb_connection import BoD_db
+from app.pagination import keyset_page
+
+MAIN_KEYS = {
+    'addrobj': ['OBJECTID', 'NAME', 'TYPENAME', 'LEVEL', 'PARENTOBJID', 'PATH'],
+    'munhierarchy': ['OKTMO', 'PATH'],
+    'params': ['TYPEID', 'VALUE'],
+    'paramtypes': ['NAME', 'DESC', 'CODE'],
+    'houses': ['OBJECTID', 'HOUSENUM', 'HOUSETYPE'],
+    'housetypes': ['NAME', 'SHORTNAME', 'DESC']
+}
+
+@cached('collections')
+def collection_names() -> list:
+    return BoD_db().list_collection_names()
 
 
 class Addrobj_list:
 
-    def get_data(limit: int, skip: int):
+    @cached('addrobj_list')
+    def get_data(limit: int, after: str = None, before: str = None):
+        """Страница адресных объектов по OBJECTID (keyset).
+        Возвращает (addrobj_list, токен следующей, токен предыдущей)."""
         main_keys = {
-            'addrobj': ['NAME', 'TYPENAME', 'LEVEL']
+            'addrobj': ['NAME', 'TYPENAME', 'LEVEL', 'LEVEL_NAME',
+                        'PARENT_NAME', 'PARENT_TYPENAME', 'OKTMO']
         }
         db = BoD_db()
         addrobj_list = {}
 
-        data = list(db.addrobj.find(
-            filter={'ISACTIVE': '1'}, limit=limit, skip=skip))
-
-        for item in data:
-            item = dict(item)
-            addrobj_list.update({item['OBJECTID']: {}})
-            objectid = item['OBJECTID']
-            for key, value in item.items():
+        items, next_token, prev_token = keyset_page(
+            db.addrobj, {'ISACTIVE': '1'}, 'OBJECTID', limit,
+            after=after, before=before, projection={'OBJECTID': 1})
+        objectids = [item['OBJECTID'] for item in items]
+        data = Addrobj.get_data(objectids)
+
+        for objectid in objectids:
+            if objectid not in data:
+                continue
+            addrobj_list.update({objectid: {}})
+            for key, value in data[objectid].items():
                 if key in main_keys['addrobj']:
                     addrobj_list[objectid].update({key: value})
 
-        return addrobj_list
+        return addrobj_list, next_token, prev_token
 
 
 class Addrobj:
 
-    def get_data(addrobj_objectid: str):
-        main_keys = {
-            'addrobj': ['OBJECTID', 'NAME', 'TYPENAME', 'LEVEL', 'PARENTOBJID', 'PATH'],
-            'munhierarchy': ['OKTMO', 'PATH'],
-            'addrobjparams': ['TYPEID', 'VALUE'],
-            'paramtypes': ['NAME', 'DESC', 'CODE'],
-            'houses': ['OBJECTID', 'HOUSENUM', 'HOUSETYPE'],
-            'housesparams': ['TYPEID', 'VALUE'],
-            'housetypes': ['NAME', 'SHORTNAME', 'DESC']
-        }
-        ADDROBJ_OBJECTID = addrobj_objectid
+    @cached('addrobj')
+    def get_data(addrobj_objectid):
+        """Возвращает плоский dict адресного объекта (или dict таких dict'ов
+        по OBJECTID, если передан список). Иерархия, родитель, названия
+        уровней, параметры и CHILDREN собираются за 5 запросов к БД
+        независимо от числа объектов."""
         db = BoD_db()
-        obj = {}
-
-        for key, value in db.addrobj.find_one({'OBJECTID': ADDROBJ_OBJECTID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['addrobj']:
-                obj.update({str(key): str(value)})
-        obj.update({'LEVEL_NAME': db.objectlevels.find_one(
-            {'LEVEL': obj['LEVEL']})['NAME']})
-
-        for key, value in db.munhierarchy.find_one({'OBJECTID': ADDROBJ_OBJECTID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['munhierarchy']:
-                obj.update({str(key): str(value)})
-
-        PARENTOBJID = db.munhierarchy.find_one(
-            {'OBJECTID': ADDROBJ_OBJECTID, 'ISACTIVE': '1'})['PARENTOBJID']
-        for key, value in db.addrobj.find_one({'OBJECTID': PARENTOBJID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['addrobj']:
-                obj.update({'PARENT_' + str(key): str(value)})
-        obj.update({'PARENT_LEVEL_NAME': db.objectlevels.find_one(
-            {'LEVEL': obj['PARENT_LEVEL']})['NAME']})
-
-        addrobjparams = list(db.addrobjparams.find(
-            {'OBJECTID': ADDROBJ_OBJECTID}))
-        paramtypes = db.paramtypes
-        for i in range(len(addrobjparams)):
-            for key, value in dict(addrobjparams[i]).items():
-                if key in main_keys['addrobjparams']:
-                    obj.update(
-                        {'PARAM_' + str(i+1) + '_' + str(key): str(value)})
-            for key, value in paramtypes.find_one({'ID': dict(addrobjparams[i])['TYPEID']}).items():
-                if key in main_keys['paramtypes']:
-                    obj.update(
-                        {'PARAM_' + str(i+1) + '_' + str(key): str(value)})
-
-        children = list(db.munhierarchy.find(
-            {'PARENTOBJID': ADDROBJ_OBJECTID}))
-        children_list = []
-        for item in children:
-            children_list.append(dict(item)['OBJECTID'])
-        obj.update({'CHILDREN': children_list})
-
+        if isinstance(addrobj_objectid, str):
+            objectids = [addrobj_objectid]
+        else:
+            objectids = list(addrobj_objectid)
+
+        pipeline = [
+            {'$match': {'OBJECTID': {'$in': objectids}, 'ISACTIVE': '1'}},
+            {'$lookup': {'from': 'munhierarchy',
+                         'localField': 'OBJECTID',
+                         'foreignField': 'OBJECTID',
+                         'as': 'MUNHIERARCHY'}},
+            {'$lookup': {'from': 'addrobjparams',
+                         'localField': 'OBJECTID',
+                         'foreignField': 'OBJECTID',
+                         'as': 'PARAMS'}},
+        ]
+        # Независимые запросы идут параллельно: основной с детьми,
+        # затем родители со справочником параметров
+        addrobjs, children_rows = parallel(
+            lambda: list(db.addrobj.aggregate(pipeline)),
+            lambda: list(db.munhierarchy.find(
+                {'PARENTOBJID': {'$in': objectids}},
+                {'OBJECTID': 1, 'PARENTOBJID': 1})))
+
+        for addrobj in addrobjs:
+            addrobj['MUNHIERARCHY'] = [row for row in addrobj['MUNHIERARCHY']
+                                       if row.get('ISACTIVE') == '1'][:1]
+        parents, paramtypes = parallel(
+            lambda: _find_in(db.addrobj, 'OBJECTID',
+                             [row['PARENTOBJID'] for addrobj in addrobjs
+                              for row in addrobj['MUNHIERARCHY']],
+                             {'ISACTIVE': '1'}),
+            lambda: _find_in(db.paramtypes, 'ID',
+                             [param['TYPEID'] for addrobj in addrobjs
+                              for param in addrobj['PARAMS']]))
+        levels = _find_in(db.objectlevels, 'LEVEL',
+                          [addrobj['LEVEL'] for addrobj in addrobjs] +
+                          [parent['LEVEL'] for parent in parents.values()])
+        children = {}
+        for row in children_rows:
+            children.setdefault(row['PARENTOBJID'], []).append(row['OBJECTID'])
+
+        result = {}
+        for addrobj in addrobjs:
+            if addrobj['OBJECTID'] in result:
+                continue
+            obj = {}
+            _flatten(obj, addrobj, MAIN_KEYS['addrobj'])
+            obj.update({'LEVEL_NAME': levels[obj['LEVEL']]['NAME']})
+
+            # У корневых объектов (регион) родителя в иерархии нет
+            for mun in addrobj['MUNHIERARCHY']:
+                _flatten(obj, mun, MAIN_KEYS['munhierarchy'])
+                if mun['PARENTOBJID'] in parents:
+                    _flatten(obj, parents[mun['PARENTOBJID']],
+                             MAIN_KEYS['addrobj'], 'PARENT_')
+                    obj.update({'PARENT_LEVEL_NAME':
+                                levels[obj['PARENT_LEVEL']]['NAME']})
+
+            _flatten_params(obj, addrobj['PARAMS'], paramtypes)
+
+            obj.update({'CHILDREN': children.get(addrobj['OBJECTID'], [])})
+            result.update({addrobj['OBJECTID']: obj})
+
+        if isinstance(addrobj_objectid, str):
+            return result.get(addrobj_objectid)
+        return result
+
+    @cached('addrobj_view')
+    def get_view(addrobj_objectid: str):
+        """Готовый документ из addrobj_view (один find_one по индексу),
+        если его ещё нет — собираем через get_data."""
+        obj = BoD_db().addrobj_view.find_one(
+            {'OBJECTID': addrobj_objectid}, {'_id': 0})
+        if obj is None:
+            obj = Addrobj.get_data(addrobj_objectid)
         return obj
 
 
 class House_list:
 
-    def get_data():
-        pass
+    @cached('house_list')
+    def get_data(limit: int, after: str = None, before: str = None):
+        """Страница домов по OBJECTID (keyset), с годом постройки,
+        этажностью и площадью из house_stats, если они известны.
+        Возвращает (house_list, токен следующей, токен предыдущей)."""
+        main_keys = {
+            'houses': ['FULL_ADDRESS', 'HOUSENUM', 'HOUSETYPES_SHORTNAME',
+                       'PARENT_1_NAME', 'PARENT_1_TYPENAME', 'OKTMO'],
+            'house_stats': ['YEAR', 'FLOORS', 'AREA']
+        }
+        db = BoD_db()
+        house_list = {}
+
+        items, next_token, prev_token = keyset_page(
+            db.houses, {'ISACTIVE': '1'}, 'OBJECTID', limit,
+            after=after, before=before, projection={'OBJECTID': 1})
+        objectids = [item['OBJECTID'] for item in items]
+        data, stats = parallel(
+            lambda: House.get_data(objectids),
+            lambda: _find_in(db.house_stats, 'OBJECTID', objectids))
+
+        for objectid in objectids:
+            if objectid not in data:
+                continue
+            house_list.update({objectid: {}})
+            _flatten(house_list[objectid], data[objectid], main_keys['houses'])
+            _flatten(house_list[objectid],
+                     {key: value for key, value in stats.get(objectid, {}).items()
+                      if value is not None},
+                     main_keys['house_stats'])
+
+        return house_list, next_token, prev_token
 
 
 class House:
 
-    def get_data(house_objectid: str):
-        main_keys = {
-            'addrobj': ['OBJECTID', 'NAME', 'TYPENAME', 'LEVEL', 'PARENTOBJID', 'PATH'],
-            'munhierarchy': ['OKTMO', 'PATH'],
-            'addrobjparams': ['TYPEID', 'VALUE'],
-            'paramtypes': ['NAME', 'DESC', 'CODE'],
-            'houses': ['OBJECTID', 'HOUSENUM', 'HOUSETYPE'],
-            'housesparams': ['TYPEID', 'VALUE'],
-            'housetypes': ['NAME', 'SHORTNAME', 'DESC']
-        }
+    @cached('house')
+    def get_data(house_objectid):
+        """Возвращает плоский dict дома (или dict таких dict'ов по OBJECTID,
+        если передан список). Вся цепочка собирается за 4 запроса к БД
+        независимо от числа домов и параметров."""
         db = BoD_db()
-        HOUSE_OBJECTID = house_objectid
-        obj = {}
-
-        for key, value in db.houses.find_one({'OBJECTID': HOUSE_OBJECTID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['houses']:
-                obj.update({str(key): str(value)})
-
-        for key, value in db.housetypes.find_one({'ID': obj['HOUSETYPE'], 'ISACTIVE': 'true'}).items():
-            if key in main_keys['housetypes']:
-                obj.update({'HOUSETYPES_' + str(key): str(value)})
-
-        for key, value in db.munhierarchy.find_one({'OBJECTID': HOUSE_OBJECTID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['munhierarchy']:
-                obj.update({str(key): str(value)})
-
-        PARENTOBJID = db.munhierarchy.find_one(
-            {'OBJECTID': HOUSE_OBJECTID, 'ISACTIVE': '1'})['PARENTOBJID']
-        for key, value in db.addrobj.find_one({'OBJECTID': PARENTOBJID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['addrobj']:
-                obj.update({'PARENT_1_' + str(key): str(value)})
-        obj.update({'PARENT_1_LEVEL_NAME': db.objectlevels.find_one(
-            {'LEVEL': obj['PARENT_1_LEVEL']})['NAME']})
-
-        PARENTOBJID = db.munhierarchy.find_one(
-            {'OBJECTID': PARENTOBJID, 'ISACTIVE': '1'})['PARENTOBJID']
-        for key, value in db.addrobj.find_one({'OBJECTID': PARENTOBJID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['addrobj']:
-                obj.update({'PARENT_2_' + str(key): str(value)})
-        obj.update({'PARENT_2_LEVEL_NAME': db.objectlevels.find_one(
-            {'LEVEL': obj['PARENT_2_LEVEL']})['NAME']})
-
-        PARENTOBJID = db.munhierarchy.find_one(
-            {'OBJECTID': PARENTOBJID, 'ISACTIVE': '1'})['PARENTOBJID']
-        for key, value in db.addrobj.find_one({'OBJECTID': PARENTOBJID, 'ISACTIVE': '1'}).items():
-            if key in main_keys['addrobj']:
-                obj.update({'PARENT_3_' + str(key): str(value)})
-        obj.update({'PARENT_3_LEVEL_NAME': db.objectlevels.find_one(
-            {'LEVEL': obj['PARENT_3_LEVEL']})['NAME']})
-
-        housesparams = list(db.housesparams.find({'OBJECTID': HOUSE_OBJECTID}))
-        paramtypes = db.paramtypes
-        for i in range(len(housesparams)):
-            for key, value in dict(housesparams[i]).items():
-                if key in main_keys['housesparams']:
-                    obj.update(
-                        {'PARAM_' + str(i+1) + '_' + str(key): str(value)})
-            for key, value in paramtypes.find_one({'ID': dict(housesparams[i])['TYPEID']}).items():
-                if key in main_keys['paramtypes']:
-                    obj.update(
-                        {'PARAM_' + str(i+1) + '_' + str(key): str(value)})
-
-        obj.update({'FULL_ADDRESS': obj['HOUSETYPES_SHORTNAME'] + ' ' + obj['HOUSENUM'] + ', ' + obj['PARENT_1_NAME'] +
-                   ' ' + obj['PARENT_1_TYPENAME'] + '., ' + obj['PARENT_3_NAME'] + ', Российская Федерация'})
-
+        if isinstance(house_objectid, str):
+            objectids = [house_objectid]
+        else:
+            objectids = list(house_objectid)
+
+        pipeline = [
+            {'$match': {'OBJECTID': {'$in': objectids}, 'ISACTIVE': '1'}},
+            {'$lookup': {'from': 'housetypes',
+                         'localField': 'HOUSETYPE',
+                         'foreignField': 'ID',
+                         'as': 'HOUSETYPES'}},
+            # Строка самого дома (DEPTH 0) и три уровня родителей над ним
+            {'$graphLookup': {'from': 'munhierarchy',
+                              'startWith': '$OBJECTID',
+                              'connectFromField': 'PARENTOBJID',
+                              'connectToField': 'OBJECTID',
+                              'as': 'MUNHIERARCHY',
+                              'maxDepth': 2,
+                              'depthField': 'DEPTH',
+                              'restrictSearchWithMatch': {'ISACTIVE': '1'}}},
+            {'$lookup': {'from': 'housesparams',
+                         'localField': 'OBJECTID',
+                         'foreignField': 'OBJECTID',
+                         'as': 'PARAMS'}},
+        ]
+        houses = list(db.houses.aggregate(pipeline))
+
+        for house in houses:
+            house['MUNHIERARCHY'] = _by_depth(house['MUNHIERARCHY'])
+        parents, paramtypes = parallel(
+            lambda: _find_in(db.addrobj, 'OBJECTID',
+                             [row['PARENTOBJID'] for house in houses
+                              for row in house['MUNHIERARCHY']],
+                             {'ISACTIVE': '1'}),
+            lambda: _find_in(db.paramtypes, 'ID',
+                             [param['TYPEID'] for house in houses
+                              for param in house['PARAMS']]))
+        levels = _find_in(db.objectlevels, 'LEVEL',
+                          [parent['LEVEL'] for parent in parents.values()])
+
+        result = {}
+        for house in houses:
+            if house['OBJECTID'] in result:
+                continue
+            obj = {}
+            _flatten(obj, house, MAIN_KEYS['houses'])
+            for housetype in house['HOUSETYPES']:
+                if housetype.get('ISACTIVE') == 'true':
+                    _flatten(obj, housetype, MAIN_KEYS['housetypes'],
+                             'HOUSETYPES_')
+                    break
+            _flatten(obj, house['MUNHIERARCHY'][0], MAIN_KEYS['munhierarchy'])
+
+            for i, row in enumerate(house['MUNHIERARCHY']):
+                prefix = 'PARENT_' + str(i+1) + '_'
+                _flatten(obj, parents[row['PARENTOBJID']],
+                         MAIN_KEYS['addrobj'], prefix)
+                obj.update({prefix + 'LEVEL_NAME':
+                            levels[obj[prefix + 'LEVEL']]['NAME']})
+
+            _flatten_params(obj, house['PARAMS'], paramtypes)
+
+            obj.update({'FULL_ADDRESS': obj['HOUSETYPES_SHORTNAME'] + ' ' + obj['HOUSENUM'] + ', ' + obj['PARENT_1_NAME'] +
+                       ' ' + obj['PARENT_1_TYPENAME'] + '., ' + obj['PARENT_3_NAME'] + ', Российская Федерация'})
+            result.update({house['OBJECTID']: obj})
+
+        if isinstance(house_objectid, str):
+            return result.get(house_objectid)
+        return result
+
+    @cached('house_view')
+    def get_view(house_objectid: str):
+        """Готовый документ из house_view (один find_one по индексу),
+        если его ещё нет — собираем через get_data."""
+        obj = BoD_db().house_view.find_one(
+            {'OBJECTID': house_objectid}, {'_id': 0})
+        if obj is None:
+            obj = House.get_data(house_objectid)
         return obj
+
+
+def get_data_many(model, objectids: list) -> dict:
+    # Для массовых сборок (search, *_view) кэш только мешает: данные нужны
+    # свежие, а тысячи объектов вытеснили бы горячие страницы
+    get_data = getattr(model.get_data, '__wrapped__', model.get_data)
+    # Один «битый» объект (нет родителя, типа и т.п.) не должен ронять
+    # сборку всей пачки: тогда добираем по одному
+    try:
+        return get_data(objectids)
+    except (KeyError, IndexError, TypeError):
+        full = {}
+        for objectid in objectids:
+            try:
+                obj = get_data(objectid)
+            except (KeyError, IndexError, TypeError):
+                continue
+            if obj is not None:
+                full[objectid] = obj
+        return full
+
+
+def _flatten(obj: dict, doc: dict, keys: list, prefix: str = ''):
+    for key, value in doc.items():
+        if key in keys:
+            obj.update({prefix + str(key): str(value)})
+
+
+def _flatten_params(obj: dict, params: list, paramtypes: dict):
+    for i in range(len(params)):
+        prefix = 'PARAM_' + str(i+1) + '_'
+        _flatten(obj, params[i], MAIN_KEYS['params'], prefix)
+        _flatten(obj, paramtypes[params[i]['TYPEID']],
+                 MAIN_KEYS['paramtypes'], prefix)
+
+
+def _find_in(collection, field: str, values: list, filter: dict = None) -> dict:
+    """Один запрос с $in вместо find_one на каждое значение.
+    Возвращает {значение field: первый найденный документ}."""
+    query = {field: {'$in': list(set(values))}}
+    query.update(filter or {})
+    found = {}
+    for doc in collection.find(query):
+        found.setdefault(doc[field], doc)
+    return found
+
+
+def _by_depth(rows: list) -> list:
+    # $graphLookup не гарантирует порядок, поэтому сортируем по DEPTH
+    # и оставляем по одной строке на уровень (как find_one раньше)
+    chain = {}
+    for row in rows:
+        chain.setdefault(row['DEPTH'], row)
+    return [chain[depth] for depth in sorted(chain)]
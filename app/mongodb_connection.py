@@ -1,9 +1,133 @@
-from pymongo import MongoClient
+import os
+import threading
+import time
+
+from pymongo import MongoClient, monitoring
+
+from app.metrics import command_stats
+from config import Config
+
+# Один MongoClient на процесс: у клиента свой пул соединений и свои
+# мониторинговые потоки, поэтому создавать его на каждый запрос дорого.
+# После fork (gunicorn) клиент родителя использовать нельзя, поэтому
+# запоминаем pid и пересоздаём клиент в дочернем процессе.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checkout_started = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.open = 0
+            self.checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+            self._checkout_started.clear()
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'wait_time_total': self.wait_time_total,
+                'wait_time_max': self.wait_time_max,
+            }
+
+    def _wait_finished(self):
+        started = self._checkout_started.pop(threading.get_ident(), None)
+        if started is not None:
+            wait = time.perf_counter() - started
+            self.wait_time_total += wait
+            self.wait_time_max = max(self.wait_time_max, wait)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self._checkout_started[threading.get_ident()] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._wait_finished()
+            self.checked_out += 1
+            self.checkouts += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._wait_finished()
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+pool_stats = PoolStats()
+
+
+def get_client() -> MongoClient:
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                pool_stats.reset()
+                _client = MongoClient(
+                    Config.MONGO_URI,
+                    maxPoolSize=Config.MONGO_MAX_POOL_SIZE,
+                    minPoolSize=Config.MONGO_MIN_POOL_SIZE,
+                    connectTimeoutMS=Config.MONGO_CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    waitQueueTimeoutMS=Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                    event_listeners=[pool_stats, command_stats],
+                    connect=False,
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def close_client():
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
 
 def getdb(name):
-    CONNECTION_STRING = "mongodb://localhost:27017/"
-    client = MongoClient(CONNECTION_STRING)
-    return client.get_database(name)
+    return get_client().get_database(name)
 
 def BoD_db():
     BoD = getdb("BoD")
@@ -0,0 +1,90 @@
+import base64
+
+from bson import json_util
+
+from app.cache import LRUCache
+
+# Постраничный вывод по ключу (keyset): вместо skip() запоминаем значение
+# ключа на границе страницы и продолжаем с него. Стоимость любой страницы
+# одинакова, сколько бы документов ни было до неё.
+
+COUNT_TTL = 300
+# Фильтр может содержать текст поиска от пользователя, поэтому кэш
+# ограничен по размеру, а счёт для поиска обрывается на COUNT_LIMIT
+COUNT_MAXSIZE = 1024
+COUNT_LIMIT = 1000
+_counts = LRUCache(COUNT_MAXSIZE, COUNT_TTL)
+
+
+def encode_token(value) -> str:
+    raw = json_util.dumps({'v': value}).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_token(token: str):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii'))
+        return json_util.loads(raw.decode('utf-8'))['v']
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def keyset_page(collection, filter: dict, key: str, limit: int,
+                after: str = None, before: str = None, projection=None):
+    """Возвращает (документы, токен следующей страницы, токен предыдущей).
+    Токены непрозрачные, их кладём в ссылки как ?after= / ?before=."""
+    after = decode_token(after)
+    before = decode_token(before)
+    query = dict(filter)
+    if before is not None:
+        query = {'$and': [filter, {key: {'$lt': before}}]}
+        direction = -1
+    else:
+        if after is not None:
+            query = {'$and': [filter, {key: {'$gt': after}}]}
+        direction = 1
+
+    docs = list(collection.find(query, projection)
+                .sort(key, direction).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if direction == -1:
+        docs.reverse()
+
+    next_token = prev_token = None
+    if docs:
+        if before is not None:
+            next_token = encode_token(docs[-1][key])
+            if has_more:
+                prev_token = encode_token(docs[0][key])
+        else:
+            if has_more:
+                next_token = encode_token(docs[-1][key])
+            if after is not None:
+                prev_token = encode_token(docs[0][key])
+    return docs, next_token, prev_token
+
+
+def cached_count(collection, filter: dict = None, limit: int = None) -> int:
+    """Без фильтра берём estimated_document_count (метаданные коллекции),
+    с фильтром считаем честно, но не чаще раза в COUNT_TTL секунд.
+    С limit счёт останавливается на limit документах."""
+    if not filter:
+        return collection.estimated_document_count()
+    cache_key = (collection.full_name, json_util.dumps(filter, sort_keys=True),
+                 limit)
+    count = _counts.get(cache_key)
+    if isinstance(count, int):
+        return count
+    if limit:
+        count = collection.count_documents(filter, limit=limit)
+    else:
+        count = collection.count_documents(filter)
+    _counts.set(cache_key, count)
+    return count
+
+
+def clear_counts():
+    _counts.clear()
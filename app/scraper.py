@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests as rq
+from bs4 import BeautifulSoup as bs
+
+# Обход alta.ru и dom.mingkh.ru: страницы качаются параллельно (пул
+# потоков), с ограничением частоты запросов на каждый хост, повторами с
+# экспоненциальной задержкой и сохранением скачанного на диск. Повторный
+# запуск берёт уже скачанные страницы из checkpoint_dir, поэтому упавший
+# обход продолжается с места остановки.
+
+ALTA_URL = 'https://www.alta.ru'
+MINGKH_URL = 'https://dom.mingkh.ru'
+CITY_FIAS_CODE = '73b29372-242c-42c5-89cd-8814bc2368af'
+MINGKH_CITY_PATH = '/ulyanovskaya-oblast/dimitrovgrad/houses'
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ScraperError(Exception):
+    pass
+
+
+class Scraper:
+
+    def __init__(self, checkpoint_dir: str, max_workers: int = 8,
+                 rate_limits: dict = None, default_rate: float = 2.0,
+                 retries: int = 5, backoff: float = 1.0, timeout: float = 30):
+        """rate_limits — запросов в секунду по хосту ({'www.alta.ru': 1.0})."""
+        self.checkpoint_dir = checkpoint_dir
+        self.max_workers = max_workers
+        self.rate_limits = rate_limits or {}
+        self.default_rate = default_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._next_request = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _session(self) -> rq.Session:
+        # requests.Session не потокобезопасна — своя на каждый поток
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = rq.Session()
+        return session
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.checkpoint_dir, name + '.html')
+
+    def _wait_turn(self, host: str):
+        interval = 1 / self.rate_limits.get(host, self.default_rate)
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request.get(host, now))
+            self._next_request[host] = start + interval
+        if start > now:
+            time.sleep(start - now)
+
+    def fetch(self, url: str) -> str:
+        path = self._path(url)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                return file.read()
+
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            self._wait_turn(host)
+            delay = self.backoff * 2 ** attempt
+            try:
+                response = self._session().get(url, timeout=self.timeout)
+            except rq.RequestException as error:
+                last_error = error
+            else:
+                if response.status_code == 200:
+                    text = response.text
+                    tmp = path + '.tmp'
+                    with open(tmp, 'w', encoding='utf-8') as file:
+                        file.write(text)
+                    os.replace(tmp, path)
+                    return text
+                last_error = ScraperError(f'{url}: HTTP {response.status_code}')
+                if response.status_code not in RETRY_STATUSES:
+                    break
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+            if attempt < self.retries:
+                time.sleep(delay)
+        raise last_error
+
+    def fetch_all(self, urls: list) -> dict:
+        """Скачать все url параллельно. Возвращает {url: html}; первая
+        неустранимая ошибка пробрасывается, скачанное остаётся на диске."""
+        urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return dict(zip(urls, pool.map(self.fetch, urls)))
+
+
+# Разбор страниц
+
+def parse_alta_streets(html: str) -> list:
+    """Коды ФИАС улиц со страницы города на alta.ru."""
+    soup = bs(html, 'html.parser')
+    return [item.attrs['href'][6:-1]
+            for item in soup.findAll('a', class_='jFastSearch_key')]
+
+
+def parse_alta_houses(html: str) -> list:
+    """Коды ФИАС домов со страницы улицы на alta.ru."""
+    soup = bs(html, 'html.parser')
+    return [item.attrs['href'][6:-1]
+            for item in soup.findAll('a', class_='kladrs-objects__number')]
+
+
+def parse_mingkh(html: str) -> dict:
+    """Таблица домов dom.mingkh.ru: {номер: [адрес, площадь, год, этажи]}."""
+    soup = bs(html, 'html.parser')
+    table_data_list = [item.string for item in soup.findAll('td')]
+    result = {}
+    for k in range(0, len(table_data_list), 6):
+        result.update({table_data_list[k]: table_data_list[k+2:k+6]})
+    return result
+
+
+def crawl_alta(scraper: Scraper, base_url: str = ALTA_URL,
+               city_code: str = CITY_FIAS_CODE) -> list:
+    """Все коды ФИАС домов города с alta.ru."""
+    city = scraper.fetch(f'{base_url}/fias/{city_code}/')
+    streets = parse_alta_streets(city)
+    pages = scraper.fetch_all(
+        [f'{base_url}/fias/{street}/' for street in streets])
+    houses = []
+    for html in pages.values():
+        houses += parse_alta_houses(html)
+    return houses
+
+
+def crawl_mingkh(scraper: Scraper, pages: int = 11, base_url: str = MINGKH_URL,
+                 city_path: str = MINGKH_CITY_PATH) -> dict:
+    """Таблица домов города с dom.mingkh.ru (все страницы списка)."""
+    urls = [f'{base_url}{city_path}?page={page}' for page in range(1, pages + 1)]
+    result = {}
+    for html in scraper.fetch_all(urls).values():
+        result.update(parse_mingkh(html))
+    return result
@@ -0,0 +1,129 @@
+import re
+
+from pymongo import ASCENDING, InsertOne
+
+from app.models import Addrobj, House, get_data_many
+
+# Поиск по улицам и домам. Для каждого адресного объекта и дома держим
+# документ в коллекции search с нормализованными словами адреса (KEYS).
+# Поиск по префиксу слова — это якорный regex по индексу KEYS, без
+# полного прохода по коллекциям.
+
+SEARCH_COLLECTION = 'search'
+SEARCHABLE = ['addrobj', 'houses']
+BATCH_SIZE = 500
+
+ACTIVE_FILTER = {
+    'Actual': {'$in': ['1', 'true']},
+    'Not actual': {'$in': ['0', 'false']},
+}
+
+
+def normalize(text: str) -> list:
+    text = str(text).lower().replace('ё', 'е')
+    return [word for word in re.split(r'[^\w/]+', text) if word]
+
+
+def search_query(query: str, kind: str = None, active: str = None) -> dict:
+    conditions = [{'KEYS': {'$regex': '^' + re.escape(word)}}
+                  for word in normalize(query)]
+    if kind is not None:
+        conditions.append({'KIND': kind})
+    if active in ACTIVE_FILTER:
+        conditions.append({'ISACTIVE': ACTIVE_FILTER[active]})
+    if not conditions:
+        return {}
+    return {'$and': conditions}
+
+
+def active_filter(active: str) -> dict:
+    if active in ACTIVE_FILTER:
+        return {'ISACTIVE': ACTIVE_FILTER[active]}
+    return {}
+
+
+def create_search_indexes(collection):
+    collection.create_index([('KIND', ASCENDING), ('KEYS', ASCENDING),
+                             ('ISACTIVE', ASCENDING)])
+    collection.create_index([('KEYS', ASCENDING)])
+    collection.create_index([('OBJECTID', ASCENDING)])
+
+
+def _search_docs(kind: str, rows: list, full: dict) -> list:
+    docs = []
+    for row in rows:
+        obj = full.get(row['OBJECTID'], {})
+        doc = {
+            'OBJECTID': row['OBJECTID'],
+            'KIND': kind,
+            'ISACTIVE': row.get('ISACTIVE'),
+        }
+        if kind == 'houses':
+            doc['NAME'] = row.get('HOUSENUM')
+            doc['FULL_ADDRESS'] = obj.get('FULL_ADDRESS', '')
+        else:
+            doc['NAME'] = row.get('NAME')
+            doc['FULL_ADDRESS'] = ', '.join(
+                str(part) for part in [
+                    row.get('TYPENAME', '') + ' ' + row.get('NAME', ''),
+                    obj.get('PARENT_TYPENAME', '') + ' ' + obj.get('PARENT_NAME', '')]
+                if part.strip())
+        keys = normalize(doc['NAME'] or '') + normalize(doc['FULL_ADDRESS'])
+        if kind == 'addrobj':
+            keys += normalize(row.get('TYPENAME', ''))
+        doc['KEYS'] = sorted(set(keys))
+        docs.append(doc)
+    return docs
+
+
+def rebuild_search(db) -> int:
+    """Полностью пересобирает коллекцию search и атомарно подменяет ею
+    старую. Возвращает число документов."""
+    tmp = db.get_collection(SEARCH_COLLECTION + '_tmp')
+    tmp.drop()
+    count = 0
+    for kind, fields in [('addrobj', ['OBJECTID', 'NAME', 'TYPENAME', 'ISACTIVE']),
+                         ('houses', ['OBJECTID', 'HOUSENUM', 'ISACTIVE'])]:
+        cursor = db.get_collection(kind).find(
+            {}, {field: 1 for field in fields}).batch_size(BATCH_SIZE)
+        batch = []
+        for row in cursor:
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                count += _write_batch(tmp, kind, batch)
+                batch = []
+        if batch:
+            count += _write_batch(tmp, kind, batch)
+
+    create_search_indexes(tmp)
+    if count:
+        tmp.rename(SEARCH_COLLECTION, dropTarget=True)
+    return count
+
+
+def refresh_search(db, objectids: list) -> int:
+    """Пересобрать документы search только для объектов objectids."""
+    collection = db.get_collection(SEARCH_COLLECTION)
+    count = 0
+    for i in range(0, len(objectids), BATCH_SIZE):
+        part = objectids[i:i+BATCH_SIZE]
+        collection.delete_many({'OBJECTID': {'$in': part}})
+        for kind, fields in [('addrobj', ['OBJECTID', 'NAME', 'TYPENAME', 'ISACTIVE']),
+                             ('houses', ['OBJECTID', 'HOUSENUM', 'ISACTIVE'])]:
+            rows = list(db.get_collection(kind).find(
+                {'OBJECTID': {'$in': part}}, {field: 1 for field in fields}))
+            if rows:
+                count += _write_batch(collection, kind, rows)
+    return count
+
+
+def _write_batch(collection, kind: str, rows: list) -> int:
+    objectids = [row['OBJECTID'] for row in rows if row.get('ISACTIVE') == '1']
+    if kind == 'houses':
+        full = get_data_many(House, objectids)
+    else:
+        full = get_data_many(Addrobj, objectids)
+    docs = _search_docs(kind, rows, full)
+    collection.bulk_write([InsertOne(doc) for doc in docs], ordered=False)
+    return len(docs)
+
@@ -0,0 +1,215 @@
+import datetime
+import re
+
+from pymongo import ASCENDING, IndexModel, InsertOne
+
+from app.buildings import BUILDINGS_COLLECTION
+from app.cache import cached
+from app.linkage import HOUSE_FACTS
+from app.materialize import HOUSE_VIEW
+from app.mongodb_connection import BoD_db
+
+# Статистика по домам для карты возраста: год постройки, этажность и
+# площадь (из dom.mingkh.ru через app/linkage.py, иначе из тегов OSM).
+# house_stats — по документу на дом с уже разобранными числами, stats —
+# заранее посчитанные гистограммы и сводки по улицам и районам. Обе
+# пересобираются после импорта данных, API только читает готовое.
+
+HOUSE_STATS = 'house_stats'
+STATS_COLLECTION = 'stats'
+BATCH_SIZE = 5000
+# Уровень ГАР «элемент планировочной структуры» — его считаем районом
+DISTRICT_LEVELS = ['7']
+YEAR_BUCKETS = [1700, 1900] + list(range(1910, 2040, 10))
+FLOOR_BUCKETS = [1, 2, 3, 4, 5, 6, 10, 17, 26, 1000]
+AREA_BUCKETS = [0, 100, 500, 1000, 2000, 5000, 10000, 20000, 10 ** 7]
+
+_YEAR = re.compile(r'(?<!\d)(1[7-9]\d\d|20\d\d)(?!\d)')
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+def parse_year(value):
+    match = _YEAR.search(str(value or ''))
+    return int(match.group(1)) if match else None
+
+
+def parse_floors(value):
+    match = _NUMBER.search(str(value or ''))
+    floors = int(float(match.group(0).replace(',', '.'))) if match else 0
+    return floors if 0 < floors < 1000 else None
+
+
+def parse_area(value):
+    match = _NUMBER.search(str(value or '').replace(' ', '').replace('\xa0', ''))
+    area = float(match.group(0).replace(',', '.')) if match else 0.0
+    return area if area > 0 else None
+
+
+def stats_doc(house: dict, facts: dict, building: dict) -> dict:
+    """Документ house_stats из house_view, house_facts (данные mingkh) и
+    связанного здания (теги OSM, центроид); нет данных — {}."""
+    doc = {'OBJECTID': house['OBJECTID'],
+           'FULL_ADDRESS': house.get('FULL_ADDRESS'),
+           'HOUSENUM': house.get('HOUSENUM'),
+           'STREET_ID': house.get('PARENT_1_OBJECTID'),
+           'STREET': ' '.join(filter(None, [house.get('PARENT_1_TYPENAME'),
+                                            house.get('PARENT_1_NAME')])),
+           'DISTRICT': None,
+           'YEAR': parse_year(facts.get('year') or building.get('start_date')),
+           'FLOORS': parse_floors(facts.get('floors') or
+                                  building.get('building:levels')),
+           'AREA': parse_area(facts.get('area'))}
+    for i in range(2, 4):
+        if house.get(f'PARENT_{i}_LEVEL') in DISTRICT_LEVELS:
+            doc['DISTRICT'] = house.get(f'PARENT_{i}_NAME')
+            break
+    if building.get('centroid'):
+        doc['centroid'] = building['centroid']
+    return doc
+
+
+def _buckets(field: str, boundaries: list) -> list:
+    return [{'$match': {field: {'$type': 'number'}}},
+            {'$bucket': {'groupBy': '$' + field, 'boundaries': boundaries,
+                         'default': 'other',
+                         'output': {'count': {'$sum': 1}}}}]
+
+
+def _group(key: dict) -> list:
+    return [{'$group': {'_id': key,
+                        'count': {'$sum': 1},
+                        'with_year': {'$sum': {'$cond': [{'$gt': ['$YEAR', 0]}, 1, 0]}},
+                        'year_min': {'$min': '$YEAR'},
+                        'year_max': {'$max': '$YEAR'},
+                        'year_avg': {'$avg': '$YEAR'},
+                        'floors_avg': {'$avg': '$FLOORS'},
+                        'floors_max': {'$max': '$FLOORS'},
+                        'area_total': {'$sum': '$AREA'}}},
+            {'$sort': {'count': -1}}]
+
+
+def _histogram(rows: list, boundaries: list, total: int) -> list:
+    counts = {row['_id']: row['count'] for row in rows}
+    histogram = [{'from': low, 'to': high, 'count': counts.get(low, 0)}
+                 for low, high in zip(boundaries, boundaries[1:])]
+    known = sum(counts.values())
+    return histogram + [{'from': None, 'to': None, 'count': total - known}]
+
+
+def _summary_row(row: dict) -> dict:
+    row = dict(row)
+    for field in ['year_avg', 'floors_avg']:
+        if row.get(field) is not None:
+            row[field] = round(row[field], 1)
+    row['area_total'] = round(row.get('area_total') or 0, 1)
+    return row
+
+
+def summarize(collection) -> dict:
+    """Гистограммы и сводки одним $facet по house_stats."""
+    facets, = collection.aggregate([{'$facet': {
+        'total': [{'$count': 'count'}],
+        'years': _buckets('YEAR', YEAR_BUCKETS),
+        'floors': _buckets('FLOORS', FLOOR_BUCKETS),
+        'area': _buckets('AREA', AREA_BUCKETS),
+        'all': _group(None),
+        'streets': _group({'id': '$STREET_ID', 'name': '$STREET',
+                           'district': '$DISTRICT'}),
+        'districts': _group('$DISTRICT'),
+    }}])
+    total = facets['total'][0]['count'] if facets['total'] else 0
+    streets = []
+    for row in facets['streets']:
+        row = _summary_row(row)
+        key = row.pop('_id')
+        streets.append(dict(row, id=key.get('id'), name=key.get('name'),
+                            district=key.get('district')))
+    districts = []
+    for row in facets['districts']:
+        row = _summary_row(row)
+        districts.append(dict(row, name=row.pop('_id')))
+    totals = _summary_row(facets['all'][0]) if facets['all'] else {}
+    totals.pop('_id', None)
+    # Гистограммы: последняя строка (from = None) — дома без значения
+    return {'totals': totals,
+            'years': _histogram(facets['years'], YEAR_BUCKETS, total),
+            'floors': _histogram(facets['floors'], FLOOR_BUCKETS, total),
+            'area': _histogram(facets['area'], AREA_BUCKETS, total),
+            'districts': districts,
+            'streets': streets}
+
+
+def _write_batch(collection, batch: list, db) -> int:
+    objectids = [house['OBJECTID'] for house in batch]
+    facts = {fact['OBJECTID']: fact for fact in db.get_collection(HOUSE_FACTS).find(
+        {'OBJECTID': {'$in': objectids}},
+        {'_id': 0, 'OBJECTID': 1, 'year': 1, 'floors': 1, 'area': 1})}
+    buildings = {building['OBJECTID']: building
+                 for building in db.get_collection(BUILDINGS_COLLECTION).find(
+                     {'OBJECTID': {'$in': objectids}},
+                     {'_id': 0, 'OBJECTID': 1, 'start_date': 1,
+                      'building:levels': 1, 'centroid': 1})}
+    collection.bulk_write([InsertOne(stats_doc(house, facts.get(house['OBJECTID'], {}),
+                                               buildings.get(house['OBJECTID'], {})))
+                           for house in batch], ordered=False)
+    return len(batch)
+
+
+def rebuild_stats(db) -> dict:
+    """Пересобрать house_stats (временная коллекция + rename) и сводку в
+    stats. Возвращает {'houses': число домов, 'built_at': время}."""
+    tmp = db.get_collection(HOUSE_STATS + '_tmp')
+    tmp.drop()
+    count = 0
+    batch = []
+    for house in db.get_collection(HOUSE_VIEW).find(
+            {}, {'_id': 0, 'OBJECTID': 1, 'FULL_ADDRESS': 1, 'HOUSENUM': 1,
+                 'PARENT_1_OBJECTID': 1, 'PARENT_1_NAME': 1, 'PARENT_1_TYPENAME': 1,
+                 'PARENT_2_LEVEL': 1, 'PARENT_2_NAME': 1, 'PARENT_3_LEVEL': 1,
+                 'PARENT_3_NAME': 1}).batch_size(BATCH_SIZE):
+        batch.append(house)
+        if len(batch) == BATCH_SIZE:
+            count += _write_batch(tmp, batch, db)
+            batch = []
+    if batch:
+        count += _write_batch(tmp, batch, db)
+
+    tmp.create_indexes([IndexModel([('OBJECTID', ASCENDING)], unique=True),
+                        IndexModel([('STREET_ID', ASCENDING), ('OBJECTID', ASCENDING)]),
+                        IndexModel([('DISTRICT', ASCENDING), ('OBJECTID', ASCENDING)]),
+                        IndexModel([('YEAR', ASCENDING)])])
+    if count:
+        tmp.rename(HOUSE_STATS, dropTarget=True)
+    else:
+        # Домов нет — сводка тоже пустая, а не по прошлой house_stats
+        tmp.drop()
+        db.get_collection(HOUSE_STATS).drop()
+    summary = summarize(db.get_collection(HOUSE_STATS))
+    built_at = datetime.datetime.now(datetime.timezone.utc)
+    db.get_collection(STATS_COLLECTION).replace_one(
+        {'_id': 'houses'}, dict(summary, _id='houses', built_at=built_at),
+        upsert=True)
+    return {'houses': count, 'built_at': built_at}
+
+
+@cached('stats')
+def get_stats():
+    """Готовая сводка (dict из rebuild_stats) или None, если её ещё нет."""
+    return BoD_db().get_collection(STATS_COLLECTION).find_one(
+        {'_id': 'houses'}, {'_id': 0})
+
+
+def house_filter(street: str = None, district: str = None,
+                 year_from: int = None, year_to: int = None) -> dict:
+    filter = {}
+    if street:
+        filter['STREET_ID'] = street
+    if district:
+        filter['DISTRICT'] = district
+    if year_from is not None or year_to is not None:
+        filter['YEAR'] = {}
+        if year_from is not None:
+            filter['YEAR']['$gte'] = year_from
+        if year_to is not None:
+            filter['YEAR']['$lte'] = year_to
+    return filter
@@ -0,0 +1,228 @@
+import datetime
+import gzip
+import math
+import sqlite3
+import threading
+
+from app.buildings import BUILDINGS_COLLECTION, CHANGES_COLLECTION
+from config import Config
+
+# Векторные тайлы (Mapbox Vector Tile) со зданиями. Готовые тайлы лежат
+# в локальном MBTiles (SQLite), сжатые gzip. Полная сборка проходит весь
+# диапазон зумов по границам города, инкрементальная — только тайлы,
+# которые пересекают здания из buildings_changes после прошлой сборки.
+
+LAYER_NAME = 'buildings'
+EXTENT = 4096
+EARTH_RADIUS = 6378137.0
+
+_local = threading.local()
+
+
+def tile_bounds(z: int, x: int, y: int) -> list:
+    """Границы тайла XYZ в градусах: [minLon, minLat, maxLon, maxLat]."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return [x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)]
+
+
+def tiles_for_bbox(bbox: list, z: int):
+    """Все тайлы зума z, которые пересекают bbox."""
+    n = 2 ** z
+
+    def column(lon):
+        return min(n - 1, max(0, int((lon + 180) / 360 * n)))
+
+    def row(lat):
+        lat = math.radians(max(-85.0511, min(85.0511, lat)))
+        return min(n - 1, max(0, int(
+            (1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)))
+
+    for x in range(column(bbox[0]), column(bbox[2]) + 1):
+        for y in range(row(bbox[3]), row(bbox[1]) + 1):
+            yield z, x, y
+
+
+def _mercator(coords):
+    import numpy
+    lon = numpy.radians(coords[:, 0])
+    lat = numpy.radians(coords[:, 1])
+    return numpy.column_stack([
+        EARTH_RADIUS * lon,
+        EARTH_RADIUS * numpy.log(numpy.tan(math.pi / 4 + lat / 2))])
+
+
+def _number(value):
+    try:
+        return int(str(value)[:4])
+    except (TypeError, ValueError):
+        return None
+
+
+def encode_tile(db, z: int, x: int, y: int) -> bytes:
+    """Собрать тайл (gzip) или вернуть b'' для пустого."""
+    import mapbox_vector_tile
+    import shapely
+    from shapely.geometry import box, shape
+
+    bounds = tile_bounds(z, x, y)
+    area = box(*bounds)
+    cursor = db.get_collection(BUILDINGS_COLLECTION).find(
+        {'geometry': {'$geoIntersects': {'$geometry': area.__geo_interface__}}},
+        {'geometry': 1, 'key': 1, 'year': 1, 'start_date': 1, 'floors': 1,
+         'building:levels': 1, 'addr:street': 1, 'addr:housenumber': 1})
+
+    features = []
+    for doc in cursor:
+        geometry = shape(doc['geometry']).intersection(area)
+        if geometry.is_empty:
+            continue
+        properties = {'key': doc['key']}
+        year = _number(doc.get('year') or doc.get('start_date'))
+        floors = _number(doc.get('floors') or doc.get('building:levels'))
+        if year is not None:
+            properties['year'] = year
+        if floors is not None:
+            properties['floors'] = floors
+        for tag in ['addr:street', 'addr:housenumber']:
+            if doc.get(tag):
+                properties[tag] = doc[tag]
+        features.append({'geometry': shapely.transform(geometry, _mercator),
+                         'properties': properties})
+    if not features:
+        return b''
+
+    quantize_bounds = shapely.transform(box(*bounds), _mercator).bounds
+    data = mapbox_vector_tile.encode(
+        [{'name': LAYER_NAME, 'features': features}],
+        default_options={'quantize_bounds': quantize_bounds,
+                         'extents': EXTENT})
+    return gzip.compress(data)
+
+
+class MBTiles:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS tiles (
+                zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER,
+                tile_data BLOB,
+                PRIMARY KEY (zoom_level, tile_column, tile_row));
+        ''')
+
+    @staticmethod
+    def _tms_row(z: int, y: int) -> int:
+        # В MBTiles строки тайлов считаются снизу (TMS)
+        return 2 ** z - 1 - y
+
+    def get(self, z: int, x: int, y: int):
+        row = self._conn.execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level=? AND '
+            'tile_column=? AND tile_row=?', (z, x, self._tms_row(z, y))).fetchone()
+        return None if row is None else row[0]
+
+    def put_many(self, tiles: list):
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)',
+                [(z, x, self._tms_row(z, y), data) for z, x, y, data in tiles])
+
+    def get_metadata(self, name: str):
+        row = self._conn.execute('SELECT value FROM metadata WHERE name=?',
+                                 (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_metadata(self, values: dict):
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO metadata VALUES (?, ?)',
+                [(name, str(value)) for name, value in values.items()])
+
+
+def get_mbtiles() -> MBTiles:
+    # sqlite-соединение своё на каждый поток
+    mbtiles = getattr(_local, 'mbtiles', None)
+    if mbtiles is None:
+        mbtiles = _local.mbtiles = MBTiles(Config.TILES_PATH)
+    return mbtiles
+
+
+def close_mbtiles():
+    """Забыть соединение текущего потока (после fork оно от родителя)."""
+    _local.mbtiles = None
+
+
+def get_tile(db, z: int, x: int, y: int) -> bytes:
+    """Тайл из кэша; если его нет — собрать, сохранить и вернуть."""
+    mbtiles = get_mbtiles()
+    data = mbtiles.get(z, x, y)
+    if data is None:
+        data = encode_tile(db, z, x, y)
+        mbtiles.put_many([(z, x, y, data)])
+    return data
+
+
+def city_bbox(db):
+    result = list(db.get_collection(BUILDINGS_COLLECTION).aggregate([
+        {'$group': {'_id': None,
+                    'min_lon': {'$min': {'$arrayElemAt': ['$bbox', 0]}},
+                    'min_lat': {'$min': {'$arrayElemAt': ['$bbox', 1]}},
+                    'max_lon': {'$max': {'$arrayElemAt': ['$bbox', 2]}},
+                    'max_lat': {'$max': {'$arrayElemAt': ['$bbox', 3]}}}}]))
+    if not result:
+        return None
+    return [result[0]['min_lon'], result[0]['min_lat'],
+            result[0]['max_lon'], result[0]['max_lat']]
+
+
+def _build(db, mbtiles: MBTiles, tiles: set) -> int:
+    batch = []
+    for z, x, y in sorted(tiles):
+        batch.append((z, x, y, encode_tile(db, z, x, y)))
+        if len(batch) == 500:
+            mbtiles.put_many(batch)
+            batch = []
+    if batch:
+        mbtiles.put_many(batch)
+    return len(tiles)
+
+
+def build_tiles(db, full: bool = False) -> int:
+    """Собрать тайлы для TILES_MIN_ZOOM..TILES_MAX_ZOOM. Без full и при
+    наличии прошлой сборки — только тайлы под изменёнными зданиями."""
+    mbtiles = get_mbtiles()
+    zooms = range(Config.TILES_MIN_ZOOM, Config.TILES_MAX_ZOOM + 1)
+    built_at = datetime.datetime.now(datetime.timezone.utc)
+    last = mbtiles.get_metadata('built_at')
+
+    tiles = set()
+    if full or last is None:
+        bbox = city_bbox(db)
+        if bbox is not None:
+            for z in zooms:
+                tiles.update(tiles_for_bbox(bbox, z))
+    else:
+        since = datetime.datetime.fromisoformat(last)
+        for change in db.get_collection(CHANGES_COLLECTION).find(
+                {'at': {'$gt': since}}, {'bbox': 1}):
+            for z in zooms:
+                tiles.update(tiles_for_bbox(change['bbox'], z))
+
+    count = _build(db, mbtiles, tiles)
+    db.get_collection(CHANGES_COLLECTION).delete_many({'at': {'$lte': built_at}})
+    bbox = city_bbox(db) or [-180, -85, 180, 85]
+    mbtiles.set_metadata({
+        'name': LAYER_NAME,
+        'format': 'pbf',
+        'minzoom': Config.TILES_MIN_ZOOM,
+        'maxzoom': Config.TILES_MAX_ZOOM,
+        'bounds': ','.join(str(value) for value in bbox),
+        'built_at': built_at.isoformat(),
+    })
+    return count
@@ -1,15 +1,28 @@
-import folium
-from flask import render_template, request, url_for, redirect
+from urllib.parse import urlencode
 
-from app import app
+from flask import (Blueprint, abort, current_app, jsonify, make_response,
+                   redirect, render_template, request, url_for)
+
+from app import cache, metrics
+from config import Config
+from app.buildings import POLYGON_ZOOM, buildings_in_bbox, parse_bbox
+from app.concurrency import parallel
+from app.export import FORMATS, export
 from app.form import *
-# from app.maps import map
-from app.mongodb_connection import BoD_db, BoD_users_db
+from app.map_folium import get_base_map
+from app.mongodb_connection import BoD_db, BoD_users_db, pool_stats
 from app.models import *
+from app.tiles import get_tile
+from app.pagination import COUNT_LIMIT, cached_count, keyset_page
+from app.stats import HOUSE_STATS, get_stats, house_filter
+from app.search import (SEARCH_COLLECTION, SEARCHABLE, active_filter,
+                        search_query)
+
+main = Blueprint('main', __name__)
 
 
-@app.route('/')
-@app.route('/home')
+@main.route('/')
+@main.route('/home')
 def home():
     title = 'My app - Main'
     heading = 'Main page'
@@ -21,12 +34,88 @@ def home():
                            content=content)
 
 
-@app.route('/api/data')
+@main.route('/api/data')
 def get_data():
-    return app.send_static_file('data.json')
-
-
-@app.route('/about')
+    return current_app.send_static_file('data.json')
+
+
+@main.route('/api/buildings')
+def get_buildings():
+    try:
+        bbox = parse_bbox(request.args.get('bbox', ''))
+        zoom = int(request.args.get('zoom', POLYGON_ZOOM))
+    except ValueError:
+        abort(400)
+    response = jsonify(buildings_in_bbox(BoD_db(), bbox, zoom))
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
+@main.route('/tiles/<int:z>/<int:x>/<int:y>.pbf')
+def get_tile_pbf(z, x, y):
+    if not Config.TILES_MIN_ZOOM <= z <= Config.TILES_MAX_ZOOM or \
+            not 0 <= x < 2 ** z or not 0 <= y < 2 ** z:
+        abort(404)
+    data = get_tile(BoD_db(), z, x, y)
+    if not data:
+        return '', 204
+    response = make_response(data)
+    response.headers['Content-Type'] = 'application/x-protobuf'
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@main.route('/api/export/<collection_name>.<any(csv, geojson, parquet):fmt>')
+def export_collection(collection_name, fmt):
+    """Вся коллекция (или house_view — дома с адресом и параметрами)
+    одним потоковым ответом. fields=A,B — только эти поля,
+    field=Actual/Not actual — фильтр по ISACTIVE."""
+    if collection_name not in collection_names():
+        abort(404)
+    fields = [field for field in request.args.get('fields', '').split(',')
+              if field]
+    gzip = fmt != 'parquet' and 'gzip' in request.accept_encodings
+    response = current_app.response_class(
+        export(BoD_db(), collection_name, fmt, fields,
+               active_filter(request.args.get('field', '---')), gzip),
+        mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = \
+        f'attachment; filename={collection_name}.{fmt}'
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@main.route('/api/pool')
+def get_pool_stats():
+    return jsonify(pool_stats.as_dict())
+
+
+@main.route('/api/cache')
+def get_cache_stats():
+    return jsonify(cache.stats.as_dict())
+
+
+@main.route('/metrics')
+def get_metrics():
+    pool = metrics.Counter('mongo_pool', 'Состояние пула соединений Mongo.',
+                           ['stat'], type='gauge')
+    for stat, value in pool_stats.as_dict().items():
+        pool.set(stat, value=value)
+    cache_requests = metrics.Counter('cache_requests_total',
+                                     'Обращения к кэшу моделей.',
+                                     ['cache', 'result'])
+    for name, counts in cache.stats.as_dict().items():
+        cache_requests.set(name, 'hit', value=counts['hits'])
+        cache_requests.set(name, 'miss', value=counts['misses'])
+    response = make_response(metrics.render_metrics([pool, cache_requests]))
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
+
+@main.route('/about')
 def about():
     title = 'My app - About'
     heading = 'About'
@@ -38,10 +127,10 @@ def about():
                            content=content)
 
 
-@app.route('/tables')
+@main.route('/tables')
 def tables():
     title = 'My app - Tables'
-    colls_list = BoD_db().list_collection_names()
+    colls_list = collection_names()
 
     content = []
     for coll in colls_list:
@@ -53,21 +142,49 @@ def tables():
                            colls_list=content)
 
 
-@app.route('/tables/<collection_name>/<page_num>', methods=['GET', 'POST'])
+@main.route('/tables/<collection_name>/<page_num>', methods=['GET', 'POST'])
 def tables_example(collection_name, page_num):
-    coll = BoD_db().get_collection(collection_name)
-    coll_size = coll.count_documents({})
-    table_name = f'{collection_name} | Page {str(page_num)} | {str(coll_size)} documents'
-    data = list(coll.find({}).limit(20).skip(20*(int(page_num)-1)))
-    headings = list(data[0].keys())
-    for_paginator = [int(page_num)-1, int(page_num), int(page_num)+1]
+    page_num = int(page_num)
+    after = request.args.get('after')
+    before = request.args.get('before')
+    query = request.args.get('q', '')
+    active = request.args.get('field', '---')
     link = f'/tables/{collection_name}'
     searchform = SearchForm()
-    filterform = FilterForm()
+    filterform = FilterForm(formdata=None, field=active)
 
-    mes = ''
     if request.method == 'POST':
-        mes = searchform.search.data
+        return redirect(link + '/1?' + urlencode(
+            {'q': searchform.search.data or '', 'field': active}))
+    # Без токена можно открыть только первую страницу: глубокие страницы
+    # доступны лишь по ссылкам пагинатора, чтобы не делать skip()
+    if page_num != 1 and after is None and before is None:
+        return redirect(link + '/1?' + urlencode({'q': query, 'field': active}))
+
+    mes = ''
+    count_limit = None
+    db = BoD_db()
+    if query and collection_name in SEARCHABLE:
+        coll = db.get_collection(SEARCH_COLLECTION)
+        filter = search_query(query, collection_name, active)
+        count_limit = COUNT_LIMIT
+        searchform.search.data = query
+    else:
+        if query:
+            mes = 'Поиск работает только по коллекциям ' + ', '.join(SEARCHABLE)
+        coll = db.get_collection(collection_name)
+        filter = active_filter(active)
+    coll_size, (data, next_token, prev_token) = parallel(
+        lambda: cached_count(coll, filter, limit=count_limit),
+        lambda: keyset_page(coll, filter, '_id', 20, after=after,
+                            before=before))
+    if count_limit and coll_size >= count_limit:
+        coll_size = f'{count_limit}+'
+    table_name = f'{collection_name} | Page {str(page_num)} | {str(coll_size)} documents'
+    headings = list(data[0].keys()) if data else []
+    for_paginator = [page_num-1, page_num, page_num+1]
+    prev_link, next_link = paginator_links(
+        link, page_num, next_token, prev_token, q=query, field=active)
 
     return render_template('tables_example.html',
                            title=f'My app - {collection_name}',
@@ -75,29 +192,33 @@ def tables_example(collection_name, page_num):
                            searchform=searchform,
                            filterform=filterform,
                            for_paginator=for_paginator,
+                           prev_link=prev_link,
+                           next_link=next_link,
                            link=link,
                            data=data,
                            headings=headings,
+                           query=query,
                            mes=mes)
 
 
-@app.route('/addrobjs/<page>', methods=['GET', 'POST'])
+@main.route('/addrobjs/<page>', methods=['GET', 'POST'])
 def addrobjs(page):
     title = 'My app - Address Objects'
     heading = 'Address Objects'
-    # TO DO Выбирать length из селектора (12, 24, 48, 96)
-    length_selector = LengthSelector()
-    if request.method == 'POST':
-        length = LengthSelector().selector.data
-    else:
-        length = 0
-    default_length = 12
-    if length == 0:
-        length = default_length
-    length = 12
-    for_paginator = [int(page)-1, int(page), int(page)+1]
+    page = int(page)
+    after = request.args.get('after')
+    before = request.args.get('before')
     link = '/addrobjs'
-    data = Addrobj_list.get_data(limit=length, skip=length*int(page)-1)
+    length_selector = LengthSelector()
+    length = page_length(length_selector)
+    if page != 1 and after is None and before is None:
+        return redirect(link + '/1')
+
+    for_paginator = [page-1, page, page+1]
+    data, next_token, prev_token = Addrobj_list.get_data(
+        limit=length, after=after, before=before)
+    prev_link, next_link = paginator_links(
+        link, page, next_token, prev_token, length=length)
     data_keys = data.keys()
     link_to_house = []
     for s in data_keys:
@@ -109,17 +230,44 @@ def addrobjs(page):
                            data=data,
                            data_keys=data_keys,
                            for_paginator=for_paginator,
+                           prev_link=prev_link,
+                           next_link=next_link,
                            length_selector=length_selector,
                            link=link,
                            link_to_house=link_to_house)
 
 
-@app.route('/addrobj/<objectid>', methods=['GET', 'POST'])
+def page_length(length_selector: LengthSelector) -> int:
+    """Размер страницы из формы (POST) или ?length=. Всё, чего нет среди
+    вариантов селектора (в том числе подделанный POST), — 12."""
+    if request.method == 'POST':
+        length = length_selector.selector.data
+    else:
+        length = request.args.get('length', 0, type=int)
+    if length not in (12, 24, 48, 96):
+        length = 12
+    return length
+
+
+def paginator_links(link: str, page: int, next_token: str, prev_token: str,
+                    **params):
+    """Ссылки «назад» и «вперёд» для пагинатора (None, если страницы нет)."""
+    prev_link = next_link = None
+    if prev_token is not None:
+        prev_link = f'{link}/{page-1}?' + urlencode(dict(params, before=prev_token))
+    if next_token is not None:
+        next_link = f'{link}/{page+1}?' + urlencode(dict(params, after=next_token))
+    return prev_link, next_link
+
+
+@main.route('/addrobj/<objectid>', methods=['GET', 'POST'])
 def addrobj(objectid):
     title = 'My app - Address Object'
     heading = 'Address Object'
     ADDROBJ_OBJECTID = objectid
-    data = Addrobj.get_data(ADDROBJ_OBJECTID)
+    data = Addrobj.get_view(ADDROBJ_OBJECTID)
+    if data is None:
+        abort(404)
 
     return render_template('addrobj.html',
                            title=title,
@@ -127,59 +275,122 @@ def addrobj(objectid):
                            data=data)
 
 
-# @app.route('/houses/<page>', methods=['GET', 'POST'])
-# def houses(page):
-#    title = 'My app - Address Objects'
-#    heading = 'Address Objects'
-#    # TO DO Выбирать length из селектора (12, 24, 48, 96)
-#    length_selector = LengthSelector()
-#    if request.method == 'POST':
-#        length = LengthSelector().selector.data
-#    else:
-#        length = 0
-#    default_length = 12
-#    if length == 0:
-#        length = default_length
-#    for_paginator = [int(page)-1, int(page), int(page)+1]
-#    link = '/addrobjs'
-#    data = House_list.get_data(LENGTH=length, SKIP=length*int(page)-1)
-#    data_keys = data.keys()
-#    link_to_house = []
-#    for s in data_keys:
-#        link_to_house.append('/addrobj/' + s)
-#
-#    return render_template('addrobjs.html',
-#        title=title,
-#        heading=heading,
-#        data=data,
-#        data_keys=data_keys,
-#        for_paginator=for_paginator,
-#        link=link,
-#        link_to_house=link_to_house,
-#        length_selector=length_selector)
-
-
-# @app.route('/house/<objectid>', methods=['GET', 'POST'])
-# def house(objectid):
-#    title = 'My app - Address Object'
-#    heading = 'Address Object'
-#    ADDROBJ_OBJECTID = objectid
-#    data = House.get_data(ADDROBJ_OBJECTID)
-#
-#    return render_template('addrobj.html',
-#        title=title,
-#        heading=heading,
-#        data=data)
+@main.route('/houses/<page>', methods=['GET', 'POST'])
+def houses(page):
+    title = 'My app - Houses'
+    heading = 'Houses'
+    page = int(page)
+    after = request.args.get('after')
+    before = request.args.get('before')
+    link = '/houses'
+    length_selector = LengthSelector()
+    length = page_length(length_selector)
+    if page != 1 and after is None and before is None:
+        return redirect(link + '/1')
+
+    for_paginator = [page-1, page, page+1]
+    data, next_token, prev_token = House_list.get_data(
+        limit=length, after=after, before=before)
+    prev_link, next_link = paginator_links(
+        link, page, next_token, prev_token, length=length)
+    data_keys = data.keys()
+    link_to_house = []
+    for s in data_keys:
+        link_to_house.append('/house/' + s)
+
+    return render_template('addrobjs.html',
+                           title=title,
+                           heading=heading,
+                           data=data,
+                           data_keys=data_keys,
+                           for_paginator=for_paginator,
+                           prev_link=prev_link,
+                           next_link=next_link,
+                           length_selector=length_selector,
+                           link=link,
+                           link_to_house=link_to_house)
+
+
+@main.route('/house/<objectid>', methods=['GET', 'POST'])
+def house(objectid):
+    title = 'My app - House'
+    heading = 'House'
+    data = House.get_view(objectid)
+    if data is None:
+        abort(404)
+
+    return render_template('addrobj.html',
+                           title=title,
+                           heading=heading,
+                           data=data)
 
 
-@app.route('/login',  methods=['GET', 'POST'])
+@main.route('/api/houses')
+def get_houses():
+    """Дома из house_stats страницами по OBJECTID: street (OBJECTID улицы),
+    district, year_from, year_to, limit (от 1 до 500), after/before."""
+    try:
+        limit = min(int(request.args.get('limit', 100)), 500)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        year_from = request.args.get('year_from', type=int)
+        year_to = request.args.get('year_to', type=int)
+        after = request.args.get('after')
+        before = request.args.get('before')
+        filter = house_filter(request.args.get('street'),
+                              request.args.get('district'), year_from, year_to)
+        coll = BoD_db().get_collection(HOUSE_STATS)
+        total, (data, next_token, prev_token) = parallel(
+            lambda: cached_count(coll, filter),
+            lambda: keyset_page(coll, filter, 'OBJECTID', limit, after=after,
+                                before=before, projection={'_id': 0}))
+    except ValueError:
+        abort(400)
+    return jsonify({'total': total, 'houses': data, 'next': next_token,
+                    'prev': prev_token})
+
+
+@main.route('/api/stats')
+def get_house_stats():
+    """Гистограммы по годам, этажности и площади и сводка по районам."""
+    stats = get_stats()
+    if stats is None:
+        abort(404)
+    response = jsonify({key: value for key, value in stats.items()
+                        if key != 'streets'})
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
+@main.route('/api/stats/streets')
+def get_street_stats():
+    """Сводка по улицам: district — только этого района, sort — count,
+    year_avg, year_min, floors_avg или area_total (по убыванию)."""
+    stats = get_stats()
+    if stats is None:
+        abort(404)
+    sort = request.args.get('sort', 'count')
+    if sort not in ('count', 'year_avg', 'year_min', 'floors_avg', 'area_total'):
+        abort(400)
+    district = request.args.get('district')
+    streets = [street for street in stats['streets']
+               if district is None or street['district'] == district]
+    # Улицы без значения — в конце
+    streets.sort(key=lambda street: (street[sort] is not None, street[sort] or 0),
+                 reverse=True)
+    response = jsonify({'built_at': stats['built_at'], 'streets': streets})
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
+
+
+@main.route('/login',  methods=['GET', 'POST'])
 def login():
     users = BoD_users_db().get_collection('users')
     form = LoginForm()
     title = 'My app - Login'
     heading = 'Log in'
     if form.validate_on_submit():
-        return redirect(url_for('index'))
+        return redirect(url_for('main.home'))
 
     return render_template('login.html',
                            title=title,
@@ -188,7 +399,7 @@ def login():
                            users=users)
 
 
-@app.route('/signup',  methods=['GET', 'POST'])
+@main.route('/signup',  methods=['GET', 'POST'])
 def signup():
     mes = ''
     users = BoD_users_db().get_collection('users')
@@ -198,7 +409,7 @@ def signup():
     if form.validate_on_submit() and users.find_one({'username': form.username.data}) is None:
         users.insert_one({'username': form.username.data,
                          'password': form.password1.data})
-        return redirect(url_for('index'), title=form.username.data)
+        return redirect(url_for('main.home'), title=form.username.data)
     else:
         mes = 'Пользователь с таким именем уже существует'
 
@@ -218,20 +429,17 @@ def signup():
 #        heading=heading)
 
 
-@app.route('/map')
+@main.route('/map')
 def map():
-    # title = 'My app - Map'
-    # heading = 'Map'
-    fol_map = folium.Map(location=[54.217044, 49.603082],
-                         zoom_start=12,
-                         zoom_control=False,
-                         width='100%',
-                         height='100%',
-                         left='0',
-                         top='0',
-                         position='sticky',
-                         )
-    fol_map.save('app/templates/map_generated.html')
-    # pos = fol_map.get_bounds.....
+    base_map = get_base_map()
     title = 'My app - Map'
-    return render_template('map_v3.html', title=title)
+    response = make_response(render_template('map_v3.html',
+                                              title=title,
+                                              map_html=base_map.html,
+                                              map_name=base_map.name,
+                                              tiles_min_zoom=Config.TILES_MIN_ZOOM,
+                                              tiles_max_zoom=Config.TILES_MAX_ZOOM))
+    # ETag — хэш всей страницы: меняется и от шаблонов, и от настроек тайлов
+    response.add_etag()
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response.make_conditional(request)
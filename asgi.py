@@ -0,0 +1,10 @@
+# ASGI-обёртка для uvicorn и подобных серверов:
+#
+#     uvicorn asgi:application --workers 4
+#
+# Приложение синхронное, asgiref выполняет его в пуле потоков.
+from asgiref.wsgi import WsgiToAsgi
+
+from wsgi import application as wsgi_application
+
+application = WsgiToAsgi(wsgi_application)
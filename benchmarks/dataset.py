@@ -0,0 +1,92 @@
+import datetime
+import random
+import uuid
+
+# Синтетический ФИАС масштаба Димитровграда: регион -> город -> районы/
+# СНТ -> улицы -> дома, ~20 тыс. домов с параметрами, как в ГАР. Набор
+# детерминирован (seed), чтобы прогоны бенчмарка были сравнимы.
+
+CITY_OKTMO = '73705000001'
+STREET_TYPES = ['ул', 'пр-кт', 'пер', 'проезд', 'б-р', 'ш']
+ADDROBJ_PARAMS = ['6', '7', '10']
+HOUSE_PARAMS = ['5', '6', '7', '8', '13', '15', '16']
+LEVELS = {'1': 'Субъект РФ', '5': 'Город', '7': 'Элемент планировочной структуры',
+          '8': 'Элемент улично-дорожной сети', '10': 'Здание (сооружение)'}
+
+
+def _guid(rnd) -> str:
+    return str(uuid.UUID(int=rnd.getrandbits(128)))
+
+
+def seed(db, houses: int = 20000, streets: int = 600, seed: int = 0) -> dict:
+    """Заполнить пустую базу db. Возвращает {'addrobj': [OBJECTID...],
+    'houses': [OBJECTID...]} — активные объекты для сценариев."""
+    rnd = random.Random(seed)
+    updated = datetime.datetime(2023, 1, 1).strftime('%Y-%m-%d')
+    next_id = iter(range(1000000, 10000000))
+
+    db.objectlevels.insert_many([{'LEVEL': level, 'NAME': name, 'ISACTIVE': 'true'}
+                                 for level, name in LEVELS.items()])
+    db.paramtypes.insert_many([{'ID': str(i), 'NAME': f'param{i}', 'DESC': f'Параметр {i}',
+                                'CODE': f'P{i}', 'ISACTIVE': 'true'} for i in range(1, 20)])
+    db.housetypes.insert_many([
+        {'ID': '2', 'NAME': 'Дом', 'SHORTNAME': 'д.', 'DESC': 'Дом', 'ISACTIVE': 'true'},
+        {'ID': '5', 'NAME': 'Здание', 'SHORTNAME': 'зд.', 'DESC': 'Здание', 'ISACTIVE': 'true'}])
+
+    addrobj, mun, addrobj_params, houses_docs, houses_params = [], [], [], [], []
+
+    def add_addrobj(name, typename, level, parent, path):
+        objectid = str(next(next_id))
+        addrobj.append({'ID': objectid, 'OBJECTID': objectid, 'OBJECTGUID': _guid(rnd),
+                        'NAME': name, 'TYPENAME': typename, 'LEVEL': level,
+                        'ISACTUAL': '1', 'ISACTIVE': '1', 'UPDATEDATE': updated})
+        path = path + '.' + objectid if path else objectid
+        mun.append({'OBJECTID': objectid, 'PARENTOBJID': parent, 'OKTMO': CITY_OKTMO,
+                    'PATH': path, 'ISACTIVE': '1'})
+        addrobj_params.extend({'OBJECTID': objectid, 'TYPEID': typeid,
+                               'VALUE': str(rnd.randrange(10 ** 10)), 'UPDATEDATE': updated}
+                              for typeid in ADDROBJ_PARAMS)
+        return objectid, path
+
+    region, region_path = add_addrobj('Ульяновская', 'обл', '1', '0', '')
+    city, city_path = add_addrobj('Димитровград', 'г', '5', region, region_path)
+    parents = [(city, city_path)]
+    for i in range(4):
+        parents.append(add_addrobj(f'Микрорайон {i + 1}', 'мкр', '7', city, city_path))
+    for i in range(6):
+        parents.append(add_addrobj(f'Садовод-{i + 1}', 'тер. СНТ', '7', city, city_path))
+
+    street_ids = []
+    for i in range(streets):
+        parent, path = rnd.choice(parents)
+        street_ids.append(add_addrobj(f'Улица {i + 1}', rnd.choice(STREET_TYPES),
+                                      '8', parent, path))
+
+    # Число домов на улице — с длинным хвостом, как в реальном городе
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(streets)]
+    active_houses = []
+    for i in range(houses):
+        street, path = rnd.choices(street_ids, weights)[0]
+        objectid = str(next(next_id))
+        number = str(rnd.randint(1, 150)) + rnd.choice([''] * 8 + ['А', 'Б'])
+        doc = {'ID': objectid, 'OBJECTID': objectid, 'OBJECTGUID': _guid(rnd),
+               'HOUSENUM': number, 'HOUSETYPE': rnd.choice(['2'] * 9 + ['5']),
+               'ISACTUAL': '1', 'ISACTIVE': '1', 'UPDATEDATE': updated}
+        houses_docs.append(doc)
+        active_houses.append(objectid)
+        # У части домов есть историческая (неактивная) версия записи
+        if rnd.random() < 0.05:
+            houses_docs.append(dict(doc, ID=str(next(next_id)), ISACTUAL='0',
+                                    ISACTIVE='0', UPDATEDATE='2019-01-01'))
+        mun.append({'OBJECTID': objectid, 'PARENTOBJID': street, 'OKTMO': CITY_OKTMO,
+                    'PATH': path + '.' + objectid, 'ISACTIVE': '1'})
+        houses_params.extend({'OBJECTID': objectid, 'TYPEID': typeid,
+                              'VALUE': str(rnd.randrange(10 ** 12)), 'UPDATEDATE': updated}
+                             for typeid in HOUSE_PARAMS)
+
+    for name, docs in [('addrobj', addrobj), ('munhierarchy', mun),
+                       ('addrobjparams', addrobj_params), ('houses', houses_docs),
+                       ('housesparams', houses_params)]:
+        for i in range(0, len(docs), 10000):
+            db.get_collection(name).insert_many(docs[i:i + 10000])
+    return {'addrobj': [street for street, _ in street_ids], 'houses': active_houses}
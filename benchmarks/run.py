@@ -0,0 +1,277 @@
+"""Бенчмарк страниц приложения на синтетическом ФИАС.
+
+    python -m benchmarks.run                      # mongomock в памяти
+    python -m benchmarks.run --mongo-uri mongodb://localhost:27017/
+
+С --mongo-uri база BoD на указанном сервере заполняется заново, поэтому
+это должен быть отдельный (тестовый) mongod. Результаты сравниваются с
+benchmarks/baseline.json: если p95 или пропускная способность
+ухудшились больше чем на --tolerance (и больше чем на NOISE_MS в
+пересчёте на запрос), либо выросло число команд Mongo
+на запрос, прогон завершается с кодом 1. Без baseline прогон тоже
+завершается с кодом 1; записать текущий прогон как baseline —
+--update-baseline.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# Разница меньше этого считается шумом, как бы ни выглядела в процентах
+NOISE_MS = 5.0
+
+
+def mongomock_commands() -> dict:
+    """Методы mongomock.Collection, которые отдают команды
+    CommandListener'у приложения: mongomock не шлёт события мониторинга,
+    а так число запросов к Mongo считается одинаково для mongomock и
+    настоящего mongod. Тесты подставляют их через monkeypatch."""
+    import itertools
+    import types
+
+    import mongomock
+
+    from app.metrics import command_stats
+
+    request_ids = itertools.count()
+    # $lookup в mongomock сам вызывает find у других коллекций — такие
+    # вложенные вызовы не считаем, на сервере это одна команда
+    nested = threading.local()
+    commands = {'find': 'find', 'find_one': 'find', 'aggregate': 'aggregate',
+                'count_documents': 'aggregate', 'estimated_document_count': 'count',
+                'distinct': 'distinct'}
+
+    def wrap(method, command):
+        def wrapper(self, *args, **kwargs):
+            if getattr(nested, 'active', False):
+                return method(self, *args, **kwargs)
+            event = types.SimpleNamespace(command={command: self.name}, command_name=command,
+                                          request_id=next(request_ids), duration_micros=0)
+            command_stats.started(event)
+            started = time.perf_counter()
+            nested.active = True
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                nested.active = False
+                event.duration_micros = int((time.perf_counter() - started) * 1e6)
+                command_stats.succeeded(event)
+        return wrapper
+
+    return {name: wrap(getattr(mongomock.Collection, name), command)
+            for name, command in commands.items()}
+
+
+def _use_mongomock():
+    """Подложить mongomock вместо клиента приложения."""
+    import mongomock
+
+    from app import mongodb_connection
+
+    for name, method in mongomock_commands().items():
+        setattr(mongomock.Collection, name, method)
+    mongodb_connection._client = mongomock.MongoClient()
+    mongodb_connection._client_pid = os.getpid()
+
+
+def prepare(houses: int, reseed: bool) -> dict:
+    from app.indexes import create_indexes
+    from app.materialize import rebuild_views
+    from app.mongodb_connection import BoD_db
+    from app.search import rebuild_search
+    from benchmarks.dataset import seed
+
+    db = BoD_db()
+    if db.houses.estimated_document_count() and not reseed:
+        sys.exit('BoD уже содержит данные: запустите с --reseed, чтобы пересоздать её')
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    started = time.perf_counter()
+    ids = seed(db, houses=houses)
+    create_indexes(db)
+    rebuild_search(db)
+    rebuild_views(db)
+    print(f'seeded {houses} houses in {time.perf_counter() - started:.1f} s')
+    return ids
+
+
+def _keyset_tokens(collection, filter, key, limit, pages) -> list:
+    """Токены after для страниц 2..pages (как в ссылках пагинатора)."""
+    from app.pagination import keyset_page
+
+    tokens, token = [], None
+    for _ in range(pages - 1):
+        _, token, _ = keyset_page(collection, filter, key, limit, after=token,
+                                  projection={key: 1})
+        if token is None:
+            break
+        tokens.append(token)
+    return tokens
+
+
+def scenarios(app, ids: dict, deep_page: int) -> dict:
+    """Имя сценария -> функция, возвращающая (url, headers) для i-го запроса."""
+    from urllib.parse import urlencode
+
+    from app.mongodb_connection import BoD_db
+
+    db = BoD_db()
+    addrobj_token = _keyset_tokens(db.addrobj, {'ISACTIVE': '1'}, 'OBJECTID', 12,
+                                   deep_page)[-1]
+    houses_token = _keyset_tokens(db.houses, {}, '_id', 20, deep_page)[-1]
+    streets = ids['addrobj']
+    # ETag /map — хэш готовой страницы, его отдаёт сам view
+    etag = app.test_client().get('/map').headers['ETag']
+    return {
+        'addrobj': lambda i: (f'/addrobj/{streets[i * 7919 % len(streets)]}', {}),
+        'addrobjs_deep': lambda i: (f'/addrobjs/{deep_page}?' + urlencode(
+            {'length': 12, 'after': addrobj_token}), {}),
+        'tables_deep': lambda i: (f'/tables/houses/{deep_page}?' + urlencode(
+            {'after': houses_token}), {}),
+        'tables_search': lambda i: ('/tables/houses/1?' + urlencode(
+            {'q': f'улица {i % 50 + 1}', 'field': 'Actual'}), {}),
+        'map': lambda i: ('/map', {}),
+        'map_not_modified': lambda i: ('/map', {'If-None-Match': etag}),
+    }
+
+
+def _request(client, request):
+    from app.metrics import last_trace
+
+    url, headers = request
+    started = time.perf_counter()
+    response = client.get(url, headers=headers)
+    seconds = time.perf_counter() - started
+    if response.status_code not in (200, 304):
+        raise RuntimeError(f'{url}: HTTP {response.status_code}')
+    trace = last_trace()
+    return seconds, sum(count for count, _ in trace.commands.values()) if trace else 0
+
+
+def _summary(latencies: list, queries: list, wall: float) -> dict:
+    latencies = sorted(latencies)
+    return {'requests': len(latencies),
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'rps': round(len(latencies) / wall, 1),
+            'queries': round(statistics.fmean(queries), 2)}
+
+
+def measure(app, make_request, iterations: int, warmup: int = 3) -> dict:
+    client = app.test_client()
+    for i in range(warmup):
+        _request(client, make_request(i))
+    latencies, queries = [], []
+    started = time.perf_counter()
+    for i in range(iterations):
+        seconds, count = _request(client, make_request(i))
+        latencies.append(seconds)
+        queries.append(count)
+    return _summary(latencies, queries, time.perf_counter() - started)
+
+
+def load(app, requests: list, total: int, concurrency: int) -> dict:
+    """Смешанная нагрузка: total запросов по кругу из requests в
+    concurrency потоков, у каждого свой test client."""
+    local = threading.local()
+
+    def worker(i):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return _request(local.client, requests[i % len(requests)](i))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(worker, range(total)))
+    return _summary([seconds for seconds, _ in results], [count for _, count in results],
+                    time.perf_counter() - started)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    problems = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance) and \
+                current['p95_ms'] - base['p95_ms'] > NOISE_MS:
+            problems.append(f'{name}: p95 {base["p95_ms"]} -> {current["p95_ms"]} ms')
+        # Для rps тот же порог шума: разница во времени на запрос
+        # (1000 / rps) должна быть больше NOISE_MS, иначе быстрые
+        # сценарии вроде map падают на любой машине медленнее базовой
+        if current['rps'] < base['rps'] * (1 - tolerance) and \
+                1000 / current['rps'] - 1000 / base['rps'] > NOISE_MS:
+            problems.append(f'{name}: rps {base["rps"]} -> {current["rps"]}')
+        if current['queries'] > base['queries']:
+            problems.append(f'{name}: mongo commands/request {base["queries"]} -> '
+                            f'{current["queries"]}')
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--mongo-uri', help='Отдельный mongod (по умолчанию mongomock).')
+    parser.add_argument('--reseed', action='store_true',
+                        help='Пересоздать BoD, даже если в ней есть данные.')
+    parser.add_argument('--houses', type=int,
+                        help='Число домов (20000; для mongomock — 2000: в нём $lookup '
+                             'без индексов и пересборка search/views квадратичная).')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--deep-page', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--load-requests', type=int, default=400)
+    parser.add_argument('--cache', action='store_true',
+                        help='Мерить с кэшем моделей (по умолчанию кэш выключен).')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--output', help='Куда записать результаты (JSON).')
+    args = parser.parse_args(argv)
+
+    from config import Config
+    if not args.cache:
+        Config.CACHE_BACKEND = 'none'
+    Config.SLOW_REQUEST_MS = 0
+    if args.mongo_uri:
+        Config.MONGO_URI = args.mongo_uri
+    from app import create_app
+    app = create_app()
+    if not args.mongo_uri:
+        _use_mongomock()
+
+    houses = args.houses or (20000 if args.mongo_uri else 2000)
+    ids = prepare(houses, args.reseed or not args.mongo_uri)
+    requests = scenarios(app, ids, args.deep_page)
+    results = {}
+    for name, make_request in requests.items():
+        results[name] = measure(app, make_request, args.iterations)
+        print(f'{name:18} {json.dumps(results[name])}')
+    results['load'] = load(app, list(requests.values()), args.load_requests, args.concurrency)
+    print(f'{"load":18} {json.dumps(results["load"])}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'baseline {args.baseline} not found, run with --update-baseline')
+        return 1
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        problems = compare(results, json.load(file), args.tolerance)
+    for problem in problems:
+        print('REGRESSION', problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Время холодного старта: свежий интерпретатор делает
+`from app import create_app; create_app()`, как воркер gunicorn.
+
+    python -m benchmarks.startup --runs 5 --max-ms 1000
+
+Печатает медиану и самые дорогие импорты (по python -X importtime).
+Код возврата 1, если медиана больше --max-ms или при старте
+импортировался какой-то из HEAVY — они должны грузиться лениво.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ['folium', 'shapely', 'numpy', 'pandas', 'pyarrow', 'mapbox_vector_tile',
+         'lxml', 'bs4', 'requests', 'redis', 'django', 'flask_login']
+SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+print(json.dumps({"ms": (time.perf_counter() - started) * 1000,
+                  "modules": sorted({name.split(".")[0] for name in sys.modules})}))
+'''
+
+
+def run_once(importtime: bool = False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', SCRIPT]
+    process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def top_imports(stderr: str, count: int) -> list:
+    """Самые дорогие импорты (суммарное время) из модулей приложения и
+    того, что они импортируют напрямую."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if cumulative.strip().isdigit() and 1 <= depth <= 3:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-ms', type=float, default=1000.0)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    times = []
+    for _ in range(args.runs):
+        result, _ = run_once()
+        times.append(result['ms'])
+    result, stderr = run_once(importtime=True)
+    median = statistics.median(times)
+    print(f'create_app: median {median:.0f} ms, min {min(times):.0f} ms '
+          f'over {args.runs} runs')
+    for ms, name in top_imports(stderr, args.top):
+        print(f'  {ms:8.1f} ms  {name}')
+
+    problems = []
+    if median > args.max_ms:
+        problems.append(f'startup {median:.0f} ms > {args.max_ms:.0f} ms')
+    heavy = sorted(set(HEAVY) & set(result['modules']))
+    if heavy:
+        problems.append('imported at startup: ' + ', '.join(heavy))
+    for problem in problems:
+        print('REGRESSION', problem)
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,3 +2,29 @@ import os
 
 class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
+
+    MONGO_URI = os.environ.get('MONGO_URI') or 'mongodb://localhost:27017/'
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+
+    # memory (LRU в процессе), redis или none
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0'
+    CACHE_MAXSIZE = int(os.environ.get('CACHE_MAXSIZE', '2048'))
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', '3600'))
+    CACHE_GENERATION_CHECK = int(os.environ.get('CACHE_GENERATION_CHECK', '5'))
+
+    # Потоки для параллельных запросов к Mongo внутри одной страницы (0 — выкл.)
+    LOOKUP_THREADS = int(os.environ.get('LOOKUP_THREADS', '8'))
+
+    # Запросы дольше этого пишутся в лог с разбивкой по командам Mongo (0 — выкл.)
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', '1000'))
+    # Столько одинаковых find/aggregate за запрос считаем N+1
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '10'))
+
+    TILES_PATH = os.environ.get('TILES_PATH') or 'tiles.mbtiles'
+    TILES_MIN_ZOOM = int(os.environ.get('TILES_MIN_ZOOM', '12'))
+    TILES_MAX_ZOOM = int(os.environ.get('TILES_MAX_ZOOM', '17'))
@@ -0,0 +1,25 @@
+import multiprocessing
+import os
+
+# gunicorn -c gunicorn.conf.py wsgi:application
+
+bind = '{}:{}'.format(os.environ.get('SERVER_HOST', '0.0.0.0'),
+                      os.environ.get('SERVER_PORT', '5555'))
+# Процессы масштабируют по ядрам, потоки внутри процесса покрывают
+# ожидание Mongo (pymongo отпускает GIL на сети)
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+# Модули приложения импортируются один раз в мастере, воркеры получают
+# их через fork; все соединения создаются лениво уже в воркерах
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+keepalive = 5
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('GUNICORN_ACCESSLOG')
+
+
+def post_fork(server, worker):
+    from wsgi import after_fork
+    after_fork()
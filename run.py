@@ -1,7 +1,9 @@
 import os
 
-from app import app
+from app import create_app
 
+# Только для разработки: один процесс Werkzeug. В продакшене —
+# gunicorn -c gunicorn.conf.py wsgi:application (см. wsgi.py)
 if __name__ == '__main__':
     HOST = os.environ.get('SERVER_HOST', 'localhost')
 
@@ -10,4 +12,4 @@ if __name__ == '__main__':
     except ValueError:
         PORT = 5555
 
-    app.run(HOST, PORT)
+    create_app().run(HOST, PORT)
@@ -0,0 +1,66 @@
+import os
+
+import mongomock
+import pytest
+
+from app import cache, mongodb_connection
+from app.mongodb_connection import BoD_db
+from benchmarks.run import mongomock_commands
+from config import Config
+
+# Ульяновская обл. -> Димитровград -> Соцгород -> улицы S1 и S2
+CITY = [('R', 'Ульяновская', 'обл', '1', '0'),
+        ('C', 'Димитровград', 'г', '5', 'R'),
+        ('D', 'Соцгород', 'мкр', '7', 'C'),
+        ('S1', 'Ленина', 'ул', '8', 'D'),
+        ('S2', 'Гагарина', 'ул', '8', 'D')]
+OKTMO = '73705000001'
+
+
+@pytest.fixture
+def mongo_db(monkeypatch):
+    """BoD на чистом mongomock. Клиент, кэш и счётчик команд подменяются
+    только на время теста."""
+    monkeypatch.setattr(Config, 'CACHE_BACKEND', 'none')
+    monkeypatch.setattr(cache, '_backend', None)
+    for name, method in mongomock_commands().items():
+        monkeypatch.setattr(mongomock.Collection, name, method)
+    monkeypatch.setattr(mongodb_connection, '_client', mongomock.MongoClient())
+    monkeypatch.setattr(mongodb_connection, '_client_pid', os.getpid())
+    return BoD_db()
+
+
+@pytest.fixture
+def seed_city(mongo_db):
+    """seed_city({OBJECTID дома: (улица, число параметров)}) заполняет
+    справочники, цепочку CITY и дома. Строки munhierarchy получают ID
+    'm' + OBJECTID."""
+    def seed(houses: dict):
+        db = mongo_db
+        db.objectlevels.insert_many([{'LEVEL': level, 'NAME': f'Уровень {level}'}
+                                     for level in ['1', '5', '7', '8', '10']])
+        db.paramtypes.insert_many([{'ID': str(i), 'NAME': f'param{i}', 'DESC': 'd',
+                                    'CODE': f'P{i}'} for i in range(1, 30)])
+        db.housetypes.insert_one({'ID': '2', 'NAME': 'Дом', 'SHORTNAME': 'д.',
+                                  'DESC': 'Дом', 'ISACTIVE': 'true'})
+        paths = {'0': ''}
+        for objectid, name, typename, level, parent in CITY:
+            paths[objectid] = (paths[parent] + '.' + objectid).lstrip('.')
+            db.addrobj.insert_one({'OBJECTID': objectid, 'NAME': name,
+                                   'TYPENAME': typename, 'LEVEL': level,
+                                   'ISACTIVE': '1'})
+            db.munhierarchy.insert_one({'ID': 'm' + objectid, 'OBJECTID': objectid,
+                                        'PARENTOBJID': parent, 'OKTMO': OKTMO,
+                                        'PATH': paths[objectid], 'ISACTIVE': '1'})
+        for number, (objectid, (street, params)) in enumerate(houses.items()):
+            db.houses.insert_one({'OBJECTID': objectid, 'HOUSENUM': str(number + 1),
+                                  'HOUSETYPE': '2', 'ISACTIVE': '1'})
+            db.munhierarchy.insert_one({'ID': 'm' + objectid, 'OBJECTID': objectid,
+                                        'PARENTOBJID': street, 'OKTMO': OKTMO,
+                                        'PATH': paths[street] + '.' + objectid,
+                                        'ISACTIVE': '1'})
+            if params:
+                db.housesparams.insert_many([{'OBJECTID': objectid, 'TYPEID': str(i + 1),
+                                              'VALUE': f'v{i}'} for i in range(params)])
+        return db
+    return seed
@@ -0,0 +1,45 @@
+import json
+
+import mongomock
+
+from app.buildings import load_buildings
+
+
+def _write_geojson(path, properties: dict):
+    feature = {'type': 'Feature', 'properties': properties,
+               'geometry': {'type': 'Polygon',
+                            'coordinates': [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}}
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({'type': 'FeatureCollection', 'features': [feature]}, file)
+
+
+def test_reload_keeps_link_fields(tmp_path):
+    db = mongomock.MongoClient().db
+    path = tmp_path / 'buildings.geojson'
+    _write_geojson(path, {'osm_id': '1', 'building': 'yes', 'name': 'Школа'})
+    load_buildings(db, str(path))
+    db.buildings.update_one({'key': 'r1'}, {'$set': {'OBJECTID': 'H', 'year': 1960}})
+
+    _write_geojson(path, {'osm_id': '1', 'building': 'school'})
+    assert load_buildings(db, str(path))['changed'] == 1
+    building = db.buildings.find_one({'key': 'r1'})
+    assert building['building'] == 'school'
+    assert 'name' not in building
+    assert (building['OBJECTID'], building['year']) == ('H', 1960)
+
+
+def test_osm_export_and_buildings_share_keys():
+    from app.buildings import building_doc
+    from app.osm import process_chunk
+
+    features = [{'type': 'Feature', 'properties': properties, 'geometry': {
+        'type': 'Polygon', 'coordinates': [[[49.60312345678, 54.21712345678],
+                                            [49.60412345678, 54.21712345678],
+                                            [49.60412345678, 54.21812345678],
+                                            [49.60312345678, 54.21712345678]]]}}
+        for properties in [{'building': 'yes'},
+                           {'building': 'yes', 'osm_way_id': '7'},
+                           {'building': 'yes', 'other_tags': '"building:levels"=>"5"'}]]
+    keys = [building_doc(feature)['key'] for feature in features]
+    assert process_chunk(features)['key'] == keys
+    assert keys[1] == 'w7'
@@ -0,0 +1,28 @@
+import socket
+
+import pytest
+
+from app import cache
+from config import Config
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_cached_falls_through_when_redis_is_down(mongo_db, monkeypatch):
+    pytest.importorskip('redis')
+    monkeypatch.setattr(Config, 'CACHE_BACKEND', 'redis')
+    monkeypatch.setattr(Config, 'CACHE_REDIS_URL',
+                        f'redis://127.0.0.1:{_closed_port()}/0')
+    monkeypatch.setattr(cache, '_backend', None)
+    misses = cache.stats.as_dict().get('redis_down', {}).get('misses', 0)
+
+    @cache.cached('redis_down')
+    def answer():
+        return 42
+
+    assert answer() == 42
+    assert cache.stats.as_dict()['redis_down']['misses'] == misses + 1
@@ -0,0 +1,37 @@
+import csv
+import io
+
+import pyarrow
+import pyarrow.parquet
+
+from app import export as export_module
+from app.export import export
+
+# house_view: у домов разное число PARAM_N_*, и поля, которых нет в
+# первой пачке, не должны теряться
+DOCS = [{'OBJECTID': '1', 'HOUSENUM': '1'},
+        {'OBJECTID': '2', 'HOUSENUM': '2'},
+        {'OBJECTID': '3', 'HOUSENUM': '3', 'PARAM_1_VALUE': 'a'},
+        {'OBJECTID': '4', 'HOUSENUM': '4', 'PARAM_1_VALUE': 'b',
+         'PARAM_2_VALUE': 'c'}]
+COLUMNS = ['OBJECTID', 'HOUSENUM', 'PARAM_1_VALUE', 'PARAM_2_VALUE']
+
+
+def _export(db, fmt: str) -> bytes:
+    return b''.join(export(db, 'house_view', fmt))
+
+
+def test_csv_header_covers_later_batches(mongo_db, monkeypatch):
+    monkeypatch.setattr(export_module, 'BATCH_SIZE', 2)
+    mongo_db.house_view.insert_many([dict(doc) for doc in DOCS])
+    rows = list(csv.reader(io.StringIO(_export(mongo_db, 'csv').decode('utf-8'))))
+    assert rows[0] == COLUMNS
+    assert rows[4] == ['4', '4', 'b', 'c']
+
+
+def test_parquet_schema_covers_later_batches(mongo_db, monkeypatch):
+    monkeypatch.setattr(export_module, 'BATCH_SIZE', 2)
+    mongo_db.house_view.insert_many([dict(doc) for doc in DOCS])
+    table = pyarrow.parquet.read_table(pyarrow.BufferReader(_export(mongo_db, 'parquet')))
+    assert table.column_names == COLUMNS
+    assert table.column('PARAM_2_VALUE').to_pylist() == [None, None, None, 'c']
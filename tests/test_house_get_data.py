@@ -0,0 +1,87 @@
+import pytest
+
+from app import metrics
+
+# House.get_data должен собирать дом за 4 команды к Mongo (агрегация +
+# родители, уровни, типы параметров) при любом числе параметров и
+# отдавать тот же плоский dict, что и прежняя реализация на find_one.
+
+MAIN_KEYS = {
+    'addrobj': ['OBJECTID', 'NAME', 'TYPENAME', 'LEVEL', 'PARENTOBJID', 'PATH'],
+    'munhierarchy': ['OKTMO', 'PATH'],
+    'paramtypes': ['NAME', 'DESC', 'CODE'],
+    'houses': ['OBJECTID', 'HOUSENUM', 'HOUSETYPE'],
+    'housesparams': ['TYPEID', 'VALUE'],
+    'housetypes': ['NAME', 'SHORTNAME', 'DESC']
+}
+
+
+def legacy_get_data(db, objectid: str) -> dict:
+    """Прежний House.get_data (find_one на каждый уровень и параметр)."""
+    obj = {}
+    for key, value in db.houses.find_one({'OBJECTID': objectid, 'ISACTIVE': '1'}).items():
+        if key in MAIN_KEYS['houses']:
+            obj.update({str(key): str(value)})
+    for key, value in db.housetypes.find_one({'ID': obj['HOUSETYPE'], 'ISACTIVE': 'true'}).items():
+        if key in MAIN_KEYS['housetypes']:
+            obj.update({'HOUSETYPES_' + str(key): str(value)})
+    for key, value in db.munhierarchy.find_one({'OBJECTID': objectid, 'ISACTIVE': '1'}).items():
+        if key in MAIN_KEYS['munhierarchy']:
+            obj.update({str(key): str(value)})
+    parentobjid = objectid
+    for level in range(1, 4):
+        parentobjid = db.munhierarchy.find_one(
+            {'OBJECTID': parentobjid, 'ISACTIVE': '1'})['PARENTOBJID']
+        prefix = f'PARENT_{level}_'
+        for key, value in db.addrobj.find_one({'OBJECTID': parentobjid, 'ISACTIVE': '1'}).items():
+            if key in MAIN_KEYS['addrobj']:
+                obj.update({prefix + str(key): str(value)})
+        obj.update({prefix + 'LEVEL_NAME': db.objectlevels.find_one(
+            {'LEVEL': obj[prefix + 'LEVEL']})['NAME']})
+    housesparams = list(db.housesparams.find({'OBJECTID': objectid}))
+    for i, param in enumerate(housesparams):
+        for key, value in param.items():
+            if key in MAIN_KEYS['housesparams']:
+                obj.update({'PARAM_' + str(i+1) + '_' + str(key): str(value)})
+        for key, value in db.paramtypes.find_one({'ID': param['TYPEID']}).items():
+            if key in MAIN_KEYS['paramtypes']:
+                obj.update({'PARAM_' + str(i+1) + '_' + str(key): str(value)})
+    obj.update({'FULL_ADDRESS': obj['HOUSETYPES_SHORTNAME'] + ' ' + obj['HOUSENUM'] + ', ' +
+                obj['PARENT_1_NAME'] + ' ' + obj['PARENT_1_TYPENAME'] + '., ' +
+                obj['PARENT_3_NAME'] + ', Российская Федерация'})
+    return obj
+
+
+@pytest.fixture
+def db(seed_city):
+    return seed_city({f'H{params}': ('S1', params) for params in [0, 1, 7, 25]})
+
+
+def _commands(func) -> int:
+    trace = metrics.RequestTrace('test')
+    metrics.run_with_trace(trace, func)
+    return sum(count for count, _ in trace.commands.values())
+
+
+@pytest.mark.parametrize('params', [0, 1, 7, 25])
+def test_house_get_data_round_trips(db, params):
+    from app.models import House
+
+    assert _commands(lambda: House.get_data(f'H{params}')) == 4
+
+
+def test_house_get_data_many_round_trips(db):
+    from app.models import House
+
+    assert _commands(lambda: House.get_data(['H0', 'H1', 'H7', 'H25'])) == 4
+
+
+@pytest.mark.parametrize('params', [1, 7, 25])
+def test_house_get_data_matches_legacy(db, params):
+    from app.models import House
+
+    objectid = f'H{params}'
+    obj = House.get_data(objectid)
+    assert obj == legacy_get_data(db, objectid)
+    assert obj['FULL_ADDRESS'] == \
+        f'д. {obj["HOUSENUM"]}, Ленина ул., Димитровград, Российская Федерация'
@@ -0,0 +1,9 @@
+from app.indexes import create_indexes
+
+
+def test_create_indexes_reports_only_new_indexes(mongo_db):
+    created = create_indexes(mongo_db)
+    assert 'houses.OBJECTID_1_ISACTIVE_1' in created
+    assert 'buildings.OBJECTID_1' in created
+    assert 'houses._id_' not in created
+    assert create_indexes(mongo_db) == []
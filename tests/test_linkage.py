@@ -0,0 +1,15 @@
+import pytest
+
+from app.linkage import normalize_house
+
+
+@pytest.mark.parametrize('house, expected', [
+    ('дом 12', '12'),
+    ('д. 12 А', '12а'),
+    ('здание 3', '3'),
+    ('зд. 4', '4'),
+    ('12a', '12а'),
+    ('дом 5 корп. 2', '5к2'),
+])
+def test_normalize_house(house, expected):
+    assert normalize_house(house) == expected
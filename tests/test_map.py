@@ -0,0 +1,13 @@
+from app import create_app
+from config import Config
+
+
+def test_map_etag_follows_rendered_page(mongo_db, monkeypatch):
+    client = create_app().test_client()
+    etag = client.get('/map').headers['ETag']
+    assert client.get('/map', headers={'If-None-Match': etag}).status_code == 304
+
+    monkeypatch.setattr(Config, 'TILES_MAX_ZOOM', Config.TILES_MAX_ZOOM - 1)
+    response = client.get('/map', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
@@ -0,0 +1,70 @@
+import pytest
+
+from app import materialize
+from app.materialize import (ADDROBJ_VIEW, HOUSE_VIEW, STATE_COLLECTION,
+                             rebuild_views, refresh_views)
+
+
+@pytest.fixture
+def db(seed_city):
+    db = seed_city({'H': ('S1', 0)})
+    rebuild_views(db)
+    return db
+
+
+def _children(db, objectid: str) -> list:
+    return db.get_collection(ADDROBJ_VIEW).find_one({'OBJECTID': objectid})['CHILDREN']
+
+
+def test_refresh_views_rewrites_old_and_new_parent(db):
+    assert _children(db, 'S1') == ['H']
+    # Перенос как в дельте ГАР: старая версия гасится, появляется новая
+    db.munhierarchy.update_one({'ID': 'mH'}, {'$set': {'ISACTIVE': '0'}})
+    db.munhierarchy.insert_one({'ID': 'mH2', 'OBJECTID': 'H', 'PARENTOBJID': 'S2',
+                                'ISACTIVE': '1'})
+    refresh_views(db, ['H'])
+    assert 'H' in _children(db, 'S2')
+
+
+def test_refresh_views_rewrites_parent_of_replaced_row(db):
+    # Строка munhierarchy заменена на месте: старого родителя видно
+    # только по текущему house_view
+    db.munhierarchy.update_one({'ID': 'mH'}, {'$set': {'PARENTOBJID': 'S2'}})
+    refresh_views(db, ['H'])
+    assert _children(db, 'S1') == []
+    assert _children(db, 'S2') == ['H']
+
+
+def test_rebuild_views_empties_view_without_active_objects(db):
+    db.houses.update_many({}, {'$set': {'ISACTIVE': '0'}})
+    assert rebuild_views(db)[HOUSE_VIEW] == 0
+    assert db.get_collection(HOUSE_VIEW).count_documents({}) == 0
+    assert HOUSE_VIEW + '_tmp' not in db.list_collection_names()
+
+
+def test_rebuild_views_keeps_old_view_and_marks_on_failure(db, monkeypatch):
+    state = db.get_collection(STATE_COLLECTION).find_one({'_id': 'views'})
+    db.houses.insert_one({'OBJECTID': 'H2', 'HOUSENUM': '2', 'HOUSETYPE': '2',
+                          'ISACTIVE': '1'})
+    monkeypatch.setattr(materialize, 'get_data_many', lambda model, ids: {})
+    with pytest.raises(RuntimeError):
+        rebuild_views(db)
+    assert db.get_collection(HOUSE_VIEW).count_documents({}) == 1
+    assert HOUSE_VIEW + '_tmp' not in db.list_collection_names()
+    assert db.get_collection(STATE_COLLECTION).find_one({'_id': 'views'}) == state
+
+
+def test_refresh_views_with_objectids_applies_reference_changes(db):
+    db.housetypes.insert_one({'ID': '3', 'NAME': 'Здание', 'SHORTNAME': 'зд.',
+                              'DESC': 'Здание', 'ISACTIVE': 'true'})
+    db.houses.update_one({'OBJECTID': 'H'}, {'$set': {'HOUSETYPE': '3'}})
+    refresh_views(db, [])
+    house = db.get_collection(HOUSE_VIEW).find_one({'OBJECTID': 'H'})
+    assert house['HOUSETYPES_SHORTNAME'] == 'зд.'
+
+
+def test_refresh_views_with_objectids_applies_other_changes(db):
+    db.addrobj.insert_one({'OBJECTID': 'S3', 'NAME': 'Мира', 'TYPENAME': 'ул',
+                           'LEVEL': '8', 'ISACTIVE': '1'})
+    refresh_views(db, ['H'])
+    assert db.get_collection(ADDROBJ_VIEW).find_one({'OBJECTID': 'S3'}) is not None
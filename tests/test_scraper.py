@@ -0,0 +1,102 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.scraper import Scraper, ScraperError
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """/page/N — 200; /flaky/N — 503 первые N раз; /missing — 404;
+    /down — всегда 503. Все запросы пишутся в server.hits."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((self.path, time.monotonic()))
+            count = sum(1 for path, _ in server.hits if path == self.path)
+        if self.path.startswith('/page/'):
+            status = 200
+        elif self.path.startswith('/flaky/'):
+            status = 503 if count <= int(self.path.rsplit('/', 1)[1]) else 200
+        elif self.path == '/down':
+            status = 503
+        else:
+            status = 404
+        body = f'<html>{self.path}</html>'.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.hits = []
+    server.lock = threading.Lock()
+    server.url = f'http://127.0.0.1:{server.server_port}'
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,),
+                              daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _scraper(tmp_path, **kwargs) -> Scraper:
+    options = {'backoff': 0.01, 'default_rate': 1000.0}
+    options.update(kwargs)
+    return Scraper(str(tmp_path), **options)
+
+
+def _paths(server) -> list:
+    return [path for path, _ in server.hits]
+
+
+def test_fetch_saves_page(server, tmp_path):
+    assert _scraper(tmp_path).fetch(server.url + '/page/1') == '<html>/page/1</html>'
+    assert _paths(server) == ['/page/1']
+
+
+def test_fetch_retries_server_errors(server, tmp_path):
+    assert _scraper(tmp_path).fetch(server.url + '/flaky/2') == '<html>/flaky/2</html>'
+    assert _paths(server) == ['/flaky/2'] * 3
+
+
+def test_fetch_gives_up_after_retries(server, tmp_path):
+    with pytest.raises(ScraperError, match='HTTP 503'):
+        _scraper(tmp_path, retries=2).fetch(server.url + '/down')
+    assert _paths(server) == ['/down'] * 3
+
+
+def test_fetch_does_not_retry_client_errors(server, tmp_path):
+    with pytest.raises(ScraperError, match='HTTP 404'):
+        _scraper(tmp_path).fetch(server.url + '/missing')
+    assert _paths(server) == ['/missing']
+
+
+def test_fetch_all_respects_rate_limit(server, tmp_path):
+    host = server.url.split('//', 1)[1]
+    scraper = _scraper(tmp_path, max_workers=5, rate_limits={host: 20.0})
+    urls = [f'{server.url}/page/{i}' for i in range(5)]
+    assert len(scraper.fetch_all(urls)) == 5
+    times = sorted(started for _, started in server.hits)
+    # 20 запросов в секунду — не чаще раза в 50 мс даже из пяти потоков
+    assert times[-1] - times[0] >= 4 * 0.05 * 0.9
+
+
+def test_fetch_all_resumes_from_checkpoint(server, tmp_path):
+    urls = [f'{server.url}/page/{i}' for i in range(3)]
+    with pytest.raises(ScraperError):
+        _scraper(tmp_path).fetch_all(urls[:2] + [server.url + '/missing'])
+    server.hits.clear()
+    # Новый процесс с тем же каталогом качает только то, чего нет на диске
+    pages = _scraper(tmp_path).fetch_all(urls)
+    assert pages[urls[0]] == '<html>/page/0</html>'
+    assert _paths(server) == ['/page/2']
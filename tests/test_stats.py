@@ -0,0 +1,28 @@
+from app.linkage import load_and_link
+from app.materialize import HOUSE_VIEW, rebuild_views
+from app.stats import HOUSE_STATS, STATS_COLLECTION, rebuild_stats
+
+
+def test_rebuild_stats_without_houses_clears_old_stats(mongo_db):
+    db = mongo_db
+    db.get_collection(HOUSE_STATS).insert_one({'OBJECTID': 'old', 'YEAR': 1960})
+    db.get_collection(HOUSE_VIEW).drop()
+    assert rebuild_stats(db)['houses'] == 0
+    assert db.get_collection(HOUSE_STATS).count_documents({}) == 0
+    assert HOUSE_STATS + '_tmp' not in db.list_collection_names()
+    stats = db.get_collection(STATS_COLLECTION).find_one({'_id': 'houses'})
+    assert stats['totals'].get('count', 0) == 0
+    assert sum(row['count'] for row in stats['years']) == 0
+    assert stats['streets'] == []
+
+
+def test_rebuild_stats_uses_mingkh_data_without_osm_building(seed_city):
+    db = seed_city({'H1': ('S1', 0), 'H2': ('S1', 0)})
+    rebuild_views(db)
+    mingkh = [{'n': 1, 'address': 'г. Димитровград, ул. Ленина, д. 1',
+               'area': '1 234,5', 'year': '1960', 'floors': '5'}]
+    load_and_link(db, mingkh)
+    rebuild_stats(db)
+    house = db.get_collection(HOUSE_STATS).find_one({'OBJECTID': 'H1'})
+    assert (house['YEAR'], house['FLOORS'], house['AREA']) == (1960, 5, 1234.5)
+    assert db.get_collection(HOUSE_STATS).find_one({'OBJECTID': 'H2'})['YEAR'] is None
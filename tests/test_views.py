@@ -0,0 +1,21 @@
+import pytest
+
+from app import create_app
+
+
+@pytest.fixture
+def client(seed_city):
+    seed_city({f'H{i:02}': ('S1', 0) for i in range(30)})
+    return create_app().test_client()
+
+
+@pytest.mark.parametrize('url', ['/addrobjs/1', '/houses/1'])
+@pytest.mark.parametrize('selector', ['abc', '7', ''])
+def test_tampered_length_selector_falls_back(client, url, selector):
+    response = client.post(url, data={'selector': selector})
+    assert response.status_code == 200
+
+
+def test_length_selector_sets_page_length(client):
+    response = client.post('/houses/1', data={'selector': '24'})
+    assert b'length=24' in response.data
@@ -0,0 +1,20 @@
+# Точка входа для продакшена (run.py — только dev-сервер Werkzeug):
+#
+#     gunicorn -c gunicorn.conf.py wsgi:application
+#
+# Число процессов и потоков задаётся в gunicorn.conf.py через переменные
+# окружения. Для uvicorn/других ASGI-серверов есть asgi.py.
+from app import create_app
+from app.mongodb_connection import close_client
+from app.tiles import close_mbtiles
+
+application = create_app()
+
+
+def after_fork():
+    """Вызывается в каждом воркере после fork. Соединения, открытые в
+    мастере (при preload_app), в дочернем процессе использовать нельзя:
+    MongoClient и пул потоков и так пересоздаются по смене pid, а
+    sqlite-соединение MBTiles сбрасываем явно."""
+    close_client()
+    close_mbtiles()